@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_verification import assets, metrics
+from bot_verification.responses import BaseHandler, Response, bytes_response, precompressed_response
+
+
+@metrics.instrumented('assets')
+def handle_get(path, headers):
+    """Serve a fingerprinted asset, or 304 if the client already has it"""
+    accept_encoding = headers.get('accept-encoding')
+    asset = assets.BY_URL.get(path.split('?', 1)[0])
+    if asset is None:
+        return bytes_response(b'Not found', 'text/plain', accept_encoding, 404)
+
+    extra = (
+        ('Cache-Control', assets.CACHE_CONTROL),
+        ('ETag', asset.etag),
+        ('Access-Control-Allow-Origin', '*'),
+    )
+    if assets.etag_matches(headers.get('if-none-match'), asset.etag):
+        return Response(304, [('Vary', 'Accept-Encoding')] + list(extra), b'')
+
+    return precompressed_response(asset.body, asset.content_type, accept_encoding, headers=extra)
+
+
+class handler(BaseHandler):
+
+    def do_GET(self):
+        self.send(handle_get(self.path, self.headers))
+
+    do_HEAD = do_GET
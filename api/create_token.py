@@ -1,57 +1,91 @@
-from http.server import BaseHTTPRequestHandler
 import json
 import time
-import hmac
-import hashlib
-import base64
 import os
+import sys
 
-SECRET_KEY = os.getenv('SECRET_KEY', 'nexora-verify-secret-2024')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class handler(BaseHTTPRequestHandler):
+from bot_verification import admission, bodies, metrics, recording, tokens
+from bot_verification.recording import recorder
+from bot_verification.responses import BaseHandler, bytes_response, preflight_response
 
-    def do_POST(self):
+
+def _outcome(name):
+    return recording.outcome(metrics.CREATE_OUTCOMES.labels(name), name)
+
+
+CREATED = _outcome('success')
+MISSING_FIELDS = _outcome('missing_fields')
+UNKNOWN_BOT = _outcome('unknown_bot')
+INVALID_REQUEST = _outcome('invalid_request')
+CREATE_ERROR = _outcome('error')
+
+
+@admission.admitted('create_token', as_json=True)
+@metrics.instrumented('create_token')
+@recording.recorded('create_token', 'POST')
+def handle_post(path, headers, body):
+    """Mint a token for a JSON {user_id, shortener_link[, bot]} body"""
+    accept_encoding = headers.get('accept-encoding')
+    try:
+        data = bodies.parse_create(body)
+        if data is None:
+            INVALID_REQUEST.inc()
+            return json_response({'success': False, 'message': 'Invalid request'}, accept_encoding)
+
+        user_id = data.get('user_id')
+        shortener_link = data.get('shortener_link')
+
+        if not user_id or not shortener_link:
+            MISSING_FIELDS.inc()
+            return json_response({'success': False, 'message': 'Missing user_id or shortener_link'}, accept_encoding)
+        if not isinstance(shortener_link, str):
+            INVALID_REQUEST.inc()
+            return json_response({'success': False, 'message': 'shortener_link must be a string'}, accept_encoding)
+
+        # Build a signed, self-contained token (no DB needed)
+        bot = data.get('bot')
+        now = int(time.time())
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            token = tokens.encode(user_id, shortener_link, now, bot=bot)
+        except KeyError:
+            UNKNOWN_BOT.inc()
+            return json_response({'success': False, 'message': f'Unknown bot: {bot}'}, accept_encoding)
+        except UnicodeEncodeError:
+            # e.g. a lone surrogate, which has no UTF-8 encoding
+            INVALID_REQUEST.inc()
+            return json_response({'success': False, 'message': 'user_id and shortener_link must be valid Unicode text'},
+                                 accept_encoding)
+
+        if recorder is not None:
+            recording.note_token(token, now)
+        CREATED.inc()
+        return json_response({'success': True, 'token': token, 'expires_in': tokens.TOKEN_TTL}, accept_encoding)
+
+    except Exception as e:
+        CREATE_ERROR.inc()
+        return json_response({'success': False, 'message': f'Error: {str(e)}'}, accept_encoding)
 
-            user_id = data.get('user_id')
-            shortener_link = data.get('shortener_link')
 
-            if not user_id or not shortener_link:
-                self.send_json({'success': False, 'message': 'Missing user_id or shortener_link'})
-                return
+MAX_BODY_SIZE = bodies.MAX_CREATE_SIZE
+PREFLIGHT = preflight_response('POST, OPTIONS')
 
-            # Build a signed, self-contained token (no DB needed)
-            timestamp = int(time.time())
-            payload = base64.urlsafe_b64encode(
-                json.dumps({'uid': str(user_id), 'link': shortener_link, 'ts': timestamp}).encode()
-            ).decode().rstrip('=')
 
-            sig = hmac.new(
-                SECRET_KEY.encode(),
-                payload.encode(),
-                hashlib.sha256
-            ).hexdigest()
+def handle_options(path, headers):
+    return PREFLIGHT
 
-            token = f"{payload}~{sig}"
 
-            self.send_json({'success': True, 'token': token, 'expires_in': 300})
+def json_response(data, accept_encoding=None):
+    return bytes_response(json.dumps(data).encode(), 'application/json', accept_encoding,
+                          headers=(('Access-Control-Allow-Origin', '*'),))
 
-        except Exception as e:
-            self.send_json({'success': False, 'message': f'Error: {str(e)}'})
+
+class handler(BaseHandler):
+
+    def do_POST(self):
+        body = self.read_body(MAX_BODY_SIZE, bodies.BODY_TIMEOUT)
+        if body is not None:
+            self.send(handle_post(self.path, self.headers, body))
 
     def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-
-    def send_json(self, data):
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.send(PREFLIGHT)
@@ -0,0 +1,181 @@
+import json
+import time
+import os
+import sys
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_verification import bodies, tokens
+from bot_verification.compression import StreamCompressor, negotiate
+from bot_verification.responses import BaseHandler, send_bytes, send_preflight
+
+MAX_BATCH_SIZE = int(os.getenv('CREATE_TOKENS_MAX_BATCH', '5000'))
+MAX_BODY_SIZE = int(os.getenv('CREATE_TOKENS_MAX_BYTES', str(4 << 20)))
+# Items are signed and written out in chunks of this size, so neither the
+# response nor (for NDJSON) the request is ever held in memory as a whole.
+CHUNK_SIZE = 256
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+UNENCODABLE = 'user_id and shortener_link must be valid Unicode text'
+
+
+def _parse_item(item):
+    """Validate one batch item. Returns (user_id, shortener_link) or an error message."""
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    user_id = item.get('user_id')
+    shortener_link = item.get('shortener_link')
+    if not user_id or not shortener_link:
+        return 'Missing user_id or shortener_link'
+    if not isinstance(shortener_link, str):
+        return 'shortener_link must be a string'
+    return user_id, shortener_link
+
+
+def _sign_each(entries, timestamp, bot=None):
+    """Sign entries one by one. Returns a token, or None for an entry that can't be encoded, per entry."""
+    minted = []
+    for entry in entries:
+        try:
+            minted.append(tokens.sign_many([entry], timestamp, bot=bot)[0])
+        except ValueError:
+            # e.g. a lone surrogate, which has no UTF-8 encoding
+            minted.append(None)
+    return minted
+
+
+def _mint_chunk(entries, timestamp, bot=None):
+    """Sign the valid entries of a chunk. Returns one result dict per entry, in order."""
+    valid = [e for e in entries if not isinstance(e, str)]
+    try:
+        minted = tokens.sign_many(valid, timestamp, bot=bot)
+    except ValueError:
+        # Report the items that can't be encoded instead of failing a response that has already started
+        minted = _sign_each(valid, timestamp, bot)
+    minted = iter(minted)
+    results = []
+    for e in entries:
+        token = None if isinstance(e, str) else next(minted)
+        if token is not None:
+            results.append({'success': True, 'token': token})
+        else:
+            results.append({'success': False, 'message': e if isinstance(e, str) else UNENCODABLE})
+    return results
+
+
+class handler(BaseHandler):
+
+    def do_POST(self):
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        timestamp = int(time.time())
+        bot = parse_qs(urlparse(self.path).query).get('bot', [None])[0]
+        try:
+            tokens.default_keyring.signer_for(bot)
+        except KeyError:
+            self.send_json({'success': False, 'message': f'Unknown bot: {bot}'}, close=True)
+            return
+
+        if content_type in NDJSON_TYPES:
+            lines = self.read_body_lines(MAX_BODY_SIZE, bodies.BATCH_BODY_TIMEOUT)
+            if lines is not None:
+                self.mint_ndjson(lines, timestamp, bot)
+            return
+
+        body = self.read_body(MAX_BODY_SIZE, bodies.BATCH_BODY_TIMEOUT)
+        if body is None:
+            return
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            self.send_json({'success': False, 'message': f'Error: {str(e)}'})
+            return
+        if not isinstance(items, list):
+            self.send_json({'success': False, 'message': 'Expected a JSON array of items'})
+            return
+        if len(items) > MAX_BATCH_SIZE:
+            self.send_json({'success': False, 'message': f'Batch too large (max {MAX_BATCH_SIZE} items)'})
+            return
+
+        self.start_response('application/json')
+        self.write(f'{{"success": true, "expires_in": {tokens.TOKEN_TTL}, "results": ['.encode())
+        separator = b''
+        for start in range(0, len(items), CHUNK_SIZE):
+            results = _mint_chunk([_parse_item(item) for item in items[start:start + CHUNK_SIZE]], timestamp, bot)
+            self.write(separator + b', '.join(json.dumps(r).encode() for r in results))
+            separator = b', '
+        self.write(b']}')
+        self.finish_response()
+
+    def mint_ndjson(self, lines, timestamp, bot=None):
+        """Mint one item per line of lines and write one result per line, chunk by chunk."""
+        self.start_response('application/x-ndjson')
+        count = 0
+        entries = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            count += 1
+            if count > MAX_BATCH_SIZE:
+                entries.append(f'Batch too large (max {MAX_BATCH_SIZE} items)')
+                # The rest of the body stays unread, so the connection can't be reused
+                self.close_connection = True
+                break
+            try:
+                entries.append(_parse_item(json.loads(line)))
+            except ValueError:
+                entries.append('Invalid JSON')
+            if len(entries) == CHUNK_SIZE:
+                self.write_ndjson(_mint_chunk(entries, timestamp, bot))
+                entries = []
+        else:
+            if not self.body_complete:
+                # Results so far have been sent; say the rest of the batch never arrived
+                entries.append('Request body not received in time')
+        if entries:
+            self.write_ndjson(_mint_chunk(entries, timestamp, bot))
+        self.finish_response()
+
+    def write_ndjson(self, results):
+        self.write(b''.join(json.dumps(r).encode() + b'\n' for r in results))
+
+    def do_OPTIONS(self):
+        send_preflight(self, 'POST, OPTIONS')
+
+    def start_response(self, content_type):
+        """Send headers for a streamed, chunked body, compressed if the client accepts it."""
+        encoding = negotiate(self.headers.get('Accept-Encoding'))
+        self.compressor = StreamCompressor(encoding) if encoding else None
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+    def write(self, data):
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.write_chunk(data)
+
+    def finish_response(self):
+        if self.compressor is not None:
+            self.write_chunk(self.compressor.finish())
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, data):
+        # An empty chunk would end the body, so skip it
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+    def send_json(self, data, close=False):
+        """Send a JSON answer. close when the body is left unread, as it can't be skipped to get to the next request."""
+        headers = (('Access-Control-Allow-Origin', '*'),)
+        if close:
+            self.close_connection = True
+            headers += (('Connection', 'close'),)
+        send_bytes(self, json.dumps(data).encode(), 'application/json', headers=headers)
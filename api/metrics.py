@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_verification import metrics
+from bot_verification.responses import BaseHandler, bytes_response
+
+
+def handle_get(path, headers):
+    """Prometheus text exposition of this instance's metrics"""
+    if not metrics.authorized(headers):
+        return bytes_response(b'Unauthorized', 'text/plain', None, 401, (('WWW-Authenticate', 'Bearer'),))
+    return bytes_response(metrics.render(), metrics.CONTENT_TYPE, headers.get('accept-encoding'), headers=(
+        ('Cache-Control', 'no-store'),
+    ))
+
+
+class handler(BaseHandler):
+
+    def do_GET(self):
+        self.send(handle_get(self.path, self.headers))
+
+    do_HEAD = do_GET
@@ -0,0 +1,29 @@
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_verification import metrics
+from bot_verification.profiling import profiler
+from bot_verification.responses import BaseHandler, bytes_response
+
+
+def handle_get(path, headers):
+    """Sampling profiler report for this instance; ?reset=1 clears it afterwards"""
+    if not metrics.authorized(headers):
+        return bytes_response(b'Unauthorized', 'text/plain', None, 401, (('WWW-Authenticate', 'Bearer'),))
+    if profiler is None:
+        return bytes_response(b'Profiling is off (set PROFILE_EVERY)', 'text/plain', None, 404)
+    body = profiler.report().encode()
+    if parse_qs(urlparse(path).query).get('reset') == ['1']:
+        profiler.reset()
+    return bytes_response(body, 'text/plain; charset=utf-8', headers.get('accept-encoding'), headers=(
+        ('Cache-Control', 'no-store'),
+    ))
+
+
+class handler(BaseHandler):
+
+    def do_GET(self):
+        self.send(handle_get(self.path, self.headers))
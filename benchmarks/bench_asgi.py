@@ -0,0 +1,172 @@
+"""
+Threaded vs asyncio server under many slow, persistent clients.
+
+Starts ``python -m bot_verification.server --workers 1`` and
+``python -m bot_verification.asgi`` on free ports and runs the same load
+against each: ``--clients`` concurrent keep-alive connections, each sending
+every request head in two parts ``--trickle`` seconds apart (a slow mobile
+uplink) and pausing ``--think`` seconds between requests, alternating
+verification page GETs and create-token POSTs. Reports throughput, latency,
+errors and the server's peak threads and RSS.
+
+Usage:
+    python benchmarks/bench_asgi.py [--clients 1000] [--requests 5] [--trickle 0.2] [--think 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bot_verification import tokens
+
+SERVERS = (
+    ('threaded', ['-m', 'bot_verification.server', '--workers', '1', '--no-reuse-port']),
+    ('asyncio', ['-m', 'bot_verification.asgi']),
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _proc_tree(pid):
+    pids = [pid]
+    for child in open(f'/proc/{pid}/task/{pid}/children').read().split():
+        pids.extend(_proc_tree(int(child)))
+    return pids
+
+
+def sample_usage(pid, peak, stop):
+    """Track peak threads and RSS (KiB) of pid and its children until stop is set."""
+    while not stop.is_set():
+        threads = rss = 0
+        try:
+            for p in _proc_tree(pid):
+                for line in open(f'/proc/{p}/status'):
+                    if line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss += int(line.split()[1])
+        except OSError:
+            pass
+        peak['threads'] = max(peak['threads'], threads)
+        peak['rss'] = max(peak['rss'], rss)
+        time.sleep(0.1)
+
+
+async def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(port, n, args, token, latencies, errors):
+    post = json.dumps({'user_id': str(n), 'shortener_link': 'https://linkshortify.com/abc123'}).encode()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        errors.append('connect')
+        return
+    try:
+        for i in range(args.requests):
+            if i % 2:
+                first = b'POST /api/create-token HTTP/1.1\r\nHost: bench\r\n'
+                rest = b'Content-Type: application/json\r\nContent-Length: %d\r\n\r\n%s' % (len(post), post)
+            else:
+                first = b'GET /pre-verify/%s?uid=%d HTTP/1.1\r\nHost: bench\r\n' % (token.encode(), n)
+                rest = b'Accept: text/html\r\n\r\n'
+            start = time.perf_counter()
+            writer.write(first)
+            await writer.drain()
+            await asyncio.sleep(args.trickle)
+            writer.write(rest)
+            status = await asyncio.wait_for(read_response(reader), 30)
+            latencies.append(time.perf_counter() - start - args.trickle)
+            if status != 200:
+                errors.append(status)
+            await asyncio.sleep(args.think)
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+        errors.append(type(e).__name__)
+    finally:
+        writer.close()
+
+
+async def load(port, args):
+    await wait_for_port(port)
+    token = tokens.encode('123456789', 'https://linkshortify.com/abc123', int(time.time()))
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, n, args, token, latencies, errors) for n in range(args.clients)))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=5, help='requests per connection')
+    parser.add_argument('--trickle', type=float, default=0.2, help='seconds between the two halves of a request head')
+    parser.add_argument('--think', type=float, default=0.5, help='seconds between requests')
+    args = parser.parse_args(argv)
+
+    # Both ends need a descriptor per connection
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    # Every client shares one token and one address: measure the servers, not the rate limits
+    env = dict(os.environ, REPLAY_BACKEND='off', ADMISSION='off')
+    print(f'{args.clients} clients x {args.requests} requests, trickle {args.trickle}s, think {args.think}s')
+    print(f'{"server":<10} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7} {"threads":>8} {"RSS MiB":>8}')
+    for name, command in SERVERS:
+        port = free_port()
+        proc = subprocess.Popen([sys.executable] + command + ['--port', str(port), '--backlog', '4096'],
+                                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        peak = {'threads': 0, 'rss': 0}
+        stop = threading.Event()
+        sampler = threading.Thread(target=sample_usage, args=(proc.pid, peak, stop), daemon=True)
+        sampler.start()
+        try:
+            elapsed, latencies, errors = asyncio.run(load(port, args))
+        finally:
+            stop.set()
+            proc.terminate()
+            proc.wait()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float('nan')
+        median = statistics.median(latencies) if latencies else float('nan')
+        print(f'{name:<10} {len(latencies) / elapsed:>8.0f} {median * 1e3:>8.2f} {p99 * 1e3:>8.2f} '
+              f'{len(errors):>7} {peak["threads"]:>8} {peak["rss"] / 1024:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Request body benchmark: parse cost and memory under adversarial bodies.
+
+Parsing: each body goes through the previous path (``body.decode()`` then
+``json.loads``, whatever the size) and the current one (the endpoint's
+``MAX_BODY_SIZE`` check, then :mod:`bot_verification.bodies`). Reports
+microseconds per body and the peak memory traced by tracemalloc for one.
+
+Wire: the same oversized and trickled bodies sent to the threaded server,
+once with ``BaseHandler.read_body`` and once with the previous unbounded
+read. Reports the status, the time until the server answered (or gave up)
+and the peak memory traced while it handled the request.
+
+Usage:
+    python benchmarks/bench_bodies.py [--count 20000] [--body-timeout 2]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from bench_keepalive import start_server
+from bot_verification import bodies
+from bot_verification.responses import BaseHandler
+
+SUBMIT = json.dumps({'user_id': '5000000123', 'interaction_time': 12, 'pow_challenge': '14.0.S6H_qjrUJHNeVqWT',
+                     'pow_nonce': '52871'}, separators=(',', ':')).encode()
+CREATE = json.dumps({'user_id': '123456789', 'shortener_link': 'https://linkshortify.com/abc123'}).encode()
+
+CASES = [
+    ('submit from the page', 'submit', SUBMIT),
+    ('create from the helper', 'create', CREATE),
+    ('submit, pretty-printed', 'submit', json.dumps(json.loads(SUBMIT), indent=2).encode()),
+    ('nested 900 deep', 'submit', b'[' * 900 + b']' * 900),
+    ('nested 100k deep', 'submit', b'[' * 100000),
+    ('1 MB string field', 'create', b'{"user_id": "1", "shortener_link": "' + b'a' * (1 << 20) + b'"}'),
+    ('64k \\u escapes', 'submit', b'{"user_id": "' + b'\\u00e9' * 65536 + b'"}'),
+    ('16 MB of 1s', 'submit', b'[' + b'1,' * (8 << 20) + b'1]'),
+    ('invalid UTF-8', 'submit', b'{"user_id": "\xff\xfe"}'),
+]
+
+
+def old_parse(body):
+    try:
+        return json.loads(body.decode('utf-8'))
+    except (ValueError, RecursionError):
+        return None
+
+
+def new_parser(kind):
+    parse = bodies.parse_submit if kind == 'submit' else bodies.parse_create
+    limit = bodies.MAX_SUBMIT_SIZE if kind == 'submit' else bodies.MAX_CREATE_SIZE
+
+    def parse_bounded(body):
+        if len(body) > limit:
+            return None
+        return parse(body)
+    return parse_bounded
+
+
+def measure(fn, body, count):
+    """Return (microseconds per call, peak traced bytes for one call)."""
+    count = max(1, min(count, int(count * 1000 / max(1000, len(body)))))
+    fn(body)
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            fn(body)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best / count * 1e6, peak
+
+
+def unbounded_read_body(self, limit, timeout):
+    """BaseHandler.read_body before size caps and deadlines."""
+    length = int(self.headers.get('Content-Length') or 0)
+    return self.rfile.read(length) if length > 0 else b''
+
+
+def send_body(port, head, chunks, interval):
+    """Send head, then chunks interval seconds apart until the server answers or closes."""
+    sock = socket.create_connection(('127.0.0.1', port))
+    start = time.perf_counter()
+    try:
+        sock.sendall(head)
+        sock.settimeout(interval or None)
+        for chunk in chunks:
+            try:
+                sock.sendall(chunk)
+            except OSError:
+                break
+            if interval:
+                try:
+                    if sock.recv(1, socket.MSG_PEEK):
+                        break
+                except socket.timeout:
+                    pass
+        sock.settimeout(30)
+        try:
+            status_line = sock.recv(4096).split(b'\r\n', 1)[0].decode()
+        except OSError:
+            status_line = ''
+    finally:
+        sock.close()
+    return status_line[9:12] or 'closed', time.perf_counter() - start
+
+
+def wire_cases(body_timeout):
+    path = b'POST /pre-verify/x/submit HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n'
+    big = 16 << 20
+    slow = int(body_timeout * 2 / 0.25)
+    return [
+        ('16 MB body', path + b'Content-Length: %d\r\n\r\n' % big, [b'1' * 65536] * (big // 65536), 0),
+        (f'trickled, {slow} B at 4 B/s', path + b'Content-Length: %d\r\n\r\n' % slow, [b'1'] * slow, 0.25),
+    ]
+
+
+def run_wire(server, body_timeout):
+    port = server.server_address[1]
+    results = []
+    for name, head, chunks, interval in wire_cases(body_timeout):
+        tracemalloc.start()
+        status, seconds = send_body(port, head, chunks, interval)
+        time.sleep(0.05)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append((name, status, seconds, peak))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--body-timeout', type=float, default=2.0,
+                        help=f'BODY_TIMEOUT for the wire cases (default 2, {bodies.BODY_TIMEOUT} when serving)')
+    args = parser.parse_args(argv)
+
+    print(f'{"body":<24} {"size":>10} {"old us":>12} {"old peak":>12} {"new us":>9} {"new peak":>10}')
+    for name, kind, body in CASES:
+        old_us, old_peak = measure(old_parse, body, args.count)
+        new_us, new_peak = measure(new_parser(kind), body, args.count)
+        print(f'{name:<24} {len(body):>10,} {old_us:>12,.2f} {old_peak:>10,} B {new_us:>9,.2f} {new_peak:>8,} B')
+
+    bodies.BODY_TIMEOUT = args.body_timeout
+    server = start_server()
+    try:
+        print()
+        print(f'{"request":<26} {"read":<10} {"status":>7} {"seconds":>8} {"server peak":>13}')
+        bounded = run_wire(server, args.body_timeout)
+        read_body = BaseHandler.read_body
+        BaseHandler.read_body = unbounded_read_body
+        try:
+            unbounded = run_wire(server, args.body_timeout)
+        finally:
+            BaseHandler.read_body = read_body
+        for label, results in (('unbounded', unbounded), ('bounded', bounded)):
+            for name, status, seconds, peak in results:
+                print(f'{name:<26} {label:<10} {status:>7} {seconds:>8.2f} {peak:>11,} B')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Cold-start benchmark: time to first response from a fresh interpreter.
+
+For each endpoint, a new Python process imports the api/ module the way the
+serverless runtime does and serves one request through its ``handler``
+class over a loopback connection. Reports, over ``--runs`` processes, the median and
+worst wall time from spawning the process to the response being written,
+plus the median time spent importing the module and serving the request.
+An interpreter that does nothing is timed too, as the floor.
+
+Median times are checked against the per-endpoint budgets (ms) in
+``benchmarks/coldstart_budget.json``; the exit status is 1 if any endpoint
+is over budget. Budgets are machine-specific, like benchmark baselines; set
+your own with ``--save-budget`` (current medians plus ``--headroom``).
+
+``--importtime`` prints, for each endpoint, the modules that took longest to
+import (``python -X importtime``, cumulative, first run only).
+
+Usage:
+    python benchmarks/bench_coldstart.py [--runs 15] [--importtime] [--budget PATH] [--save-budget]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DEFAULT_BUDGET = os.path.join(HERE, 'coldstart_budget.json')
+IMPORT_TIME_TOP = 12
+
+
+def endpoint_requests():
+    """Return [(name, api module, raw HTTP request)]. Imports the package, so call it in the parent only."""
+    sys.path.insert(0, ROOT)
+    from bot_verification import assets, challenge, tokens
+
+    now = int(time.time())
+    token = tokens.encode('123456789', 'https://linkshortify.com/abc123', now)
+    submit_token = tokens.encode('123456790', 'https://linkshortify.com/abc124', now)
+    pow_challenge = challenge.issue(submit_token, 0)
+
+    def request(method, path, body=None, content_type='application/json'):
+        head = f'{method} {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\nAccept-Encoding: gzip, br\r\n'
+        if body is None:
+            return (head + '\r\n').encode()
+        body = json.dumps(body).encode() if content_type == 'application/json' else body
+        return (head + f'Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n').encode() + body
+
+    return [
+        ('index', 'index', request('GET', '/')),
+        ('verify_page', 'verify', request('GET', f'/pre-verify/{token}?uid=123456789')),
+        ('verify_submit', 'verify', request('POST', f'/pre-verify/{submit_token}/submit', {
+            'user_id': '123456790', 'interaction_time': 10,
+            'pow_challenge': pow_challenge, 'pow_nonce': challenge.solve(pow_challenge)})),
+        ('create_token', 'create_token', request('POST', '/api/create-token', {
+            'user_id': '123456789', 'shortener_link': 'https://linkshortify.com/abc123'})),
+        ('create_tokens', 'create_tokens', request('POST', '/api/create-tokens', b''.join(
+            json.dumps({'user_id': str(i), 'shortener_link': f'https://linkshortify.com/{i}'}).encode() + b'\n'
+            for i in range(10)), 'application/x-ndjson')),
+        ('static_asset', 'assets', request('GET', assets.url('verify.js'))),
+        ('metrics', 'metrics', request('GET', '/api/metrics')),
+    ]
+
+
+# Runs in the fresh interpreter with the module name as argument: import the module, serve the
+# request read from stdin and print timings. Kept to builtins so it imports nothing the module doesn't.
+CHILD = """
+import sys, time
+start = time.perf_counter()
+request = sys.stdin.buffer.read()
+import importlib.util, os
+spec = importlib.util.spec_from_file_location(sys.argv[1], os.path.join('api', sys.argv[1] + '.py'))
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+import socket
+listener = socket.create_server(('127.0.0.1', 0))
+client_end = socket.create_connection(listener.getsockname())
+server_end, address = listener.accept()
+client_end.sendall(request)
+module.handler.log_message = lambda self, *args: None
+module.handler(server_end, address, None)
+server_end.close()
+served = time.perf_counter()
+status = client_end.recv(64).split(b' ', 2)[1].decode()
+print('%.3f %.3f %s' % ((imported - start) * 1e3, (served - imported) * 1e3, status), flush=True)
+"""
+
+
+def spawn(args, stdin=b'', env=None):
+    """Run a fresh interpreter. Returns (wall ms until its first output line, that line, stderr)."""
+    with tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable] + args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=errors, cwd=ROOT, env=env)
+        process.stdin.write(stdin)
+        process.stdin.close()
+        line = process.stdout.readline()
+        elapsed = (time.perf_counter() - start) * 1e3
+        process.stdout.read()
+        process.wait()
+        errors.seek(0)
+        return elapsed, line, errors.read()
+
+
+def import_profile(stderr, top=IMPORT_TIME_TOP):
+    """[(cumulative ms, module)] of the slowest imports in -X importtime output."""
+    rows = []
+    for line in stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1e3, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure(name, module, request, runs, importtime):
+    walls, imports, serves = [], [], []
+    status = profile = None
+    for i in range(runs):
+        args = ['-X', 'importtime'] if importtime and i == 0 else []
+        wall, line, stderr = spawn(args + ['-c', CHILD, module], request)
+        if not line:
+            raise RuntimeError(f'{name}: no response\n{stderr.decode()}')
+        import_ms, request_ms, status = line.split()
+        if args:
+            profile = import_profile(stderr)
+            continue
+        walls.append(wall)
+        imports.append(float(import_ms))
+        serves.append(float(request_ms))
+    return {
+        'status': status.decode(),
+        'median_ms': statistics.median(walls),
+        'max_ms': max(walls),
+        'import_ms': statistics.median(imports),
+        'request_ms': statistics.median(serves),
+        'imports': profile,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15, help='processes per endpoint (default 15)')
+    parser.add_argument('--importtime', action='store_true', help='show the slowest imports per endpoint')
+    parser.add_argument('--budget', default=DEFAULT_BUDGET)
+    parser.add_argument('--save-budget', action='store_true', help='store current medians plus headroom as budgets')
+    parser.add_argument('--headroom', type=float, default=0.5, help='added to medians by --save-budget (default 0.5)')
+    args = parser.parse_args(argv)
+
+    budget = {}
+    if os.path.exists(args.budget) and not args.save_budget:
+        with open(args.budget) as f:
+            budget = json.load(f)['budget_ms']
+
+    floor = statistics.median(spawn(['-c', 'print()'])[0] for _ in range(args.runs))
+    print(f'interpreter startup: {floor:.1f} ms')
+    print(f'{"endpoint":<15} {"status":>6} {"median ms":>10} {"max ms":>8} {"import ms":>10} {"request ms":>11} '
+          f'{"budget ms":>10}')
+    results = {}
+    over = []
+    for name, module, request in endpoint_requests():
+        result = results[name] = measure(name, module, request, args.runs, args.importtime)
+        limit = budget.get(name)
+        flag = ''
+        if limit is not None and result['median_ms'] > limit:
+            over.append(name)
+            flag = '  OVER BUDGET'
+        print(f'{name:<15} {result["status"]:>6} {result["median_ms"]:>10.1f} {result["max_ms"]:>8.1f} '
+              f'{result["import_ms"]:>10.1f} {result["request_ms"]:>11.2f} '
+              f'{"-" if limit is None else f"{limit:.0f}":>10}{flag}')
+    if args.importtime:
+        for name, result in results.items():
+            print(f'\nslowest imports for {name} (cumulative ms)')
+            for ms, module in result['imports']:
+                print(f'  {ms:8.1f}  {module}')
+
+    if args.save_budget:
+        with open(args.budget, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'budget_ms': {
+                name: round(result['median_ms'] * (1 + args.headroom)) for name, result in results.items()}},
+                f, indent=2)
+            f.write('\n')
+        print(f'Budget saved to {args.budget}')
+    elif over:
+        print(f'\n{len(over)} endpoint(s) over budget: {", ".join(over)}')
+        return 1
+    elif budget:
+        print('\nAll endpoints within budget.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Response compression benchmark.
+
+For every response type reports the wire size with no compression, gzip and
+(when the ``brotli`` package is installed) brotli, plus the CPU time spent per
+response: negotiation + variant lookup for precompressed static bodies, and
+on-the-fly compression for per-request bodies.
+
+Usage:
+    python benchmarks/bench_compression.py [--count 2000]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bot_verification import assets, compression, tokens
+
+ACCEPT_ENCODING = {'gzip': 'gzip, deflate', 'br': 'gzip, deflate, br'}
+
+
+def load_handler_module(name):
+    spec = importlib.util.spec_from_file_location(f'bench_{name}', os.path.join(ROOT, 'api', f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def per_call_us(fn, count):
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    verify = load_handler_module('verify')
+    index = load_handler_module('index')
+    now = int(time.time())
+    token = tokens.encode('123456789', 'https://linkshortify.com/abc123', now)
+    batch = [tokens.encode(str(5000000000 + i), f'https://linkshortify.com/{i:08x}', now) for i in range(1000)]
+
+    static = [
+        ('index page', index.INDEX_PAGE),
+        ('error page', verify.ERROR_PAGES['Verification link has expired']),
+    ] + [(f'asset {name}', asset.body) for name, asset in assets.BY_NAME.items()]
+    dynamic = [
+        ('verify page', b''.join(verify.render_verification_page(token, now))),
+        ('submit json', json.dumps({'success': True, 'redirect_url': 'https://linkshortify.com/abc123'}).encode()),
+        ('create-tokens x1000', json.dumps({'success': True, 'results': [
+            {'success': True, 'token': t} for t in batch]}).encode()),
+    ]
+
+    encodings = [e for e in ('gzip', 'br') if e in compression.SUPPORTED]
+    header = f'{"response":<26} {"identity":>9}' + ''.join(f' {e:>9} {e + " us":>9}' for e in encodings)
+    print(header)
+    for name, body in static:
+        row = f'{name + " (static)":<26} {len(body.identity):>9,}'
+        for encoding in encodings:
+            ae = ACCEPT_ENCODING[encoding]
+            _, wire = body.select(ae)
+            row += f' {len(wire):>9,} {per_call_us(lambda: body.select(ae), args.count * 10):>9.2f}'
+        print(row)
+    for name, body in dynamic:
+        row = f'{name + " (dynamic)":<26} {len(body):>9,}'
+        for encoding in encodings:
+            ae = ACCEPT_ENCODING[encoding]
+            _, wire = compression.compress_dynamic(body, ae)
+            row += f' {len(wire):>9,} {per_call_us(lambda: compression.compress_dynamic(body, ae), args.count):>9.2f}'
+        print(row)
+    if 'br' not in encodings:
+        print('(install the optional "brotli" package to include brotli)')
+
+
+if __name__ == '__main__':
+    main()
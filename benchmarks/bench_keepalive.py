@@ -0,0 +1,127 @@
+"""
+Connections-per-flow load test for HTTP/1.1 keep-alive.
+
+Serves the api/ handlers in-process through bot_verification.server and runs
+complete verification flows (create-token, GET page, GET css, GET js, POST
+submit) from concurrent clients, once opening a new connection for every
+request (what HTTP/1.0 responses forced) and once reusing one persistent
+connection per client. Reports connections accepted per flow and flow latency.
+
+Usage:
+    python benchmarks/bench_keepalive.py [--flows 200] [--concurrency 8]
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('REPLAY_BACKEND', 'off')
+# Solving is the client's cost; the server's check is the same at any difficulty
+os.environ.setdefault('POW_DIFFICULTY', '0')
+os.environ.setdefault('POW_MAX_DIFFICULTY', '0')
+
+from bot_verification import challenge
+from bot_verification.server import Router, WorkerServer, bind_socket, build_handler_class
+
+POW_CHALLENGE = re.compile(rb'const POW_CHALLENGE = "([^"]+)"')
+# A user id per flow, so the per-user rate limit doesn't apply across flows
+user_ids = itertools.count(6000000000)
+
+
+class CountingServer(WorkerServer):
+    """WorkerServer that counts accepted connections and keeps request logs quiet."""
+
+    connections = 0
+
+    def get_request(self):
+        request = WorkerServer.get_request(self)
+        self.connections += 1
+        return request
+
+
+def solve_page(page):
+    """The pow_challenge/pow_nonce fields answering a rendered verify page."""
+    pow_challenge = POW_CHALLENGE.search(page).group(1).decode()
+    return {'pow_challenge': pow_challenge, 'pow_nonce': challenge.solve(pow_challenge)}
+
+
+def start_server():
+    handler_class = build_handler_class(Router.from_config())
+    handler_class.log_message = lambda self, *args: None
+    for cls in handler_class.routed_classes:
+        cls.log_message = handler_class.log_message
+    server = CountingServer(bind_socket('127.0.0.1', 0, 1024, False), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_flow(port, conn, keep_alive):
+    """Run one verification flow. conn is reused when keep_alive, else a new one per request."""
+    def request(method, path, body=None):
+        c = conn if keep_alive else http.client.HTTPConnection('127.0.0.1', port)
+        headers = {'Content-Type': 'application/json'}
+        if not keep_alive:
+            headers['Connection'] = 'close'
+        c.request(method, path, body, headers)
+        response = c.getresponse()
+        data = response.read()
+        if not keep_alive:
+            c.close()
+        return data
+
+    user_id = str(next(user_ids))
+    start = time.perf_counter()
+    token = json.loads(request('POST', '/api/create-token', json.dumps(
+        {'user_id': user_id, 'shortener_link': 'https://linkshortify.com/abc123'})))['token']
+    page = request('GET', f'/pre-verify/{token}?uid={user_id}')
+    for asset in re.findall(rb'/static/[^"]+', page):
+        request('GET', asset.decode())
+    result = json.loads(request('POST', f'/pre-verify/{token}/submit', json.dumps(
+        {'user_id': user_id, 'interaction_time': 10, **solve_page(page)})))
+    assert result['success'], result
+    return time.perf_counter() - start
+
+
+def run(server, flows, concurrency, keep_alive):
+    port = server.server_address[1]
+    local = threading.local()
+
+    def worker(_):
+        if keep_alive and not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port)
+        return run_flow(port, getattr(local, 'conn', None), keep_alive)
+
+    before = server.connections
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(pool.map(worker, range(flows)))
+    return (server.connections - before) / flows, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--flows', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    server = start_server()
+    print(f'{"mode":<22} {"conns/flow":>10} {"p50 ms":>8} {"p95 ms":>8}')
+    for name, keep_alive in (('connection per request', False), ('keep-alive', True)):
+        conns, latencies = run(server, args.flows, args.concurrency, keep_alive)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f'{name:<22} {conns:>10.2f} {statistics.median(latencies) * 1e3:>8.2f} {p95 * 1e3:>8.2f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
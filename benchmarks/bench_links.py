@@ -0,0 +1,111 @@
+"""
+Shortener link benchmark: token length and codec cost, v3 vs v4 links.
+
+Builds a seeded corpus of shortener URLs in the shapes bots send: short codes
+on the shorteners in the v4 link dictionary, long API/quick-link URLs that
+wrap a bot start link, and links on hosts the dictionary doesn't know. Each
+is minted as a v3 token (the link stored as-is) and as a v4 token (the link
+compacted with ``tokens.LINK_DICTIONARY_V4``). Reports, per kind of link, the
+mean and p95 token length in characters and the microseconds to encode and
+decode one token, and checks every v4 token decodes to its exact link.
+
+Usage:
+    python benchmarks/bench_links.py [--count 2000] [--seed 25]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_verification import tokens
+
+CODE = string.ascii_letters + string.digits
+UNKNOWN_HOSTS = ('https://lnk.example.net/', 'https://go.mybot.app/', 'http://s.example.org/r/',
+                 'https://www.example.com/dl/')
+BOTS = ('FileStoreBot', 'MoviesHubRobot', 'AnimeDrive_bot', 'SeriesVaultBot')
+
+
+def code(rng, low, high):
+    return ''.join(rng.choice(CODE) for _ in range(rng.randint(low, high)))
+
+
+def corpus(count, seed):
+    """[(kind, link)] with count links of each kind."""
+    rng = random.Random(seed)
+    hosts = [p for p in tokens.LINK_DICTIONARY_V4.prefixes if p.count('/') == 3]
+    links = []
+    for _ in range(count):
+        links.append(('short code', rng.choice(hosts) + code(rng, 4, 10)))
+    for _ in range(count):
+        start = f'https://t.me/{rng.choice(BOTS)}?start=verify_{code(rng, 8, 24)}'
+        api = code(rng, 40, 40).lower()
+        if rng.random() < 0.5:
+            link = f'{rng.choice(hosts)}st?api={api}&url={start}'
+        else:
+            link = f'{rng.choice(hosts)}api?api={api}&url={start}&alias={code(rng, 6, 8)}&format=text'
+        links.append(('api link', link))
+    for _ in range(count):
+        links.append(('unknown host', rng.choice(UNKNOWN_HOSTS) + code(rng, 6, 32)))
+    return links
+
+
+def v3_encode(user_id, link, timestamp):
+    """encode() as it was before link compaction."""
+    kid, signer = tokens.default_keyring.signer_for()
+    data = link.encode()
+    body = b''.join((bytes((3, kid)), tokens._uid_field(user_id), tokens._pack_ts(timestamp),
+                     tokens._varint(len(data)), data))
+    return tokens._b64encode(body + signer.mac(body)).decode().rstrip('=')
+
+
+def per_call_us(fn, items, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(*item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def p95(values):
+    return sorted(values)[int(len(values) * 0.95)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000, help='links of each kind (default 2000)')
+    parser.add_argument('--seed', type=int, default=25)
+    args = parser.parse_args(argv)
+
+    now = int(time.time())
+    links = corpus(args.count, args.seed)
+    kinds = list(dict.fromkeys(kind for kind, _ in links))
+
+    print(f'{"links":<14} {"link chars":>10} {"version":>8} {"mean len":>9} {"p95 len":>8} '
+          f'{"encode us":>10} {"decode us":>10}')
+    for kind in kinds:
+        items = [('5000000123', link, now) for k, link in links if k == kind]
+        link_chars = statistics.mean(len(link) for _, link, _ in items)
+        for version, encode in (('v3', v3_encode), ('v4', tokens.encode)):
+            minted = [(encode(*item),) for item in items]
+            for (token,), (_, link, _) in zip(minted, items):
+                if tokens.decode(token) != ('5000000123', link, now):
+                    raise SystemExit(f'{version} token for {link!r} does not round-trip')
+            lengths = [len(token) for token, in minted]
+            print(f'{kind:<14} {link_chars:>10.1f} {version:>8} {statistics.mean(lengths):>9.1f} '
+                  f'{p95(lengths):>8} {per_call_us(encode, items):>10.2f} '
+                  f'{per_call_us(tokens.decode, minted):>10.2f}')
+
+    deflated = sum(tokens.LINK_DICTIONARY_V4.pack(link)[0] & 1 for _, link in links)
+    print(f'\n{len(links)} links round-tripped exactly; {deflated} stored deflated')
+
+
+if __name__ == '__main__':
+    main()
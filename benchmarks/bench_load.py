@@ -0,0 +1,134 @@
+"""
+End-to-end load generator for the verification flow.
+
+Each flow is what a real user causes: the bot creates a token
+(POST /api/create-token), the user opens the page (GET /pre-verify/<token>)
+and submits it (POST /pre-verify/<token>/submit). ``--concurrency`` clients
+run flows back to back over persistent connections until ``--flows`` are done.
+Reports flows/sec and p50/p95/p99 latency per step and per flow.
+
+By default the api/ handlers are served in-process by the threaded server;
+``--url`` points the load at a running server instead (e.g.
+``python -m bot_verification.server`` or ``python -m bot_verification.asgi``).
+
+Usage:
+    python benchmarks/bench_load.py [--flows 2000] [--concurrency 16] [--url http://127.0.0.1:8000]
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_keepalive import solve_page, start_server
+
+STEPS = ('create', 'page', 'submit')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def run_flow(conn, n):
+    """Run one create -> page -> submit flow. Returns per-step latencies in seconds."""
+    def request(method, path, body=None):
+        start = time.perf_counter()
+        conn.request(method, path, body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError(f'{method} {path} returned {response.status}')
+        return data, time.perf_counter() - start
+
+    user_id = str(5000000000 + n)
+    data, create = request('POST', '/api/create-token', json.dumps(
+        {'user_id': user_id, 'shortener_link': f'https://linkshortify.com/{n:08x}'}))
+    token = json.loads(data)['token']
+    html, page = request('GET', f'/pre-verify/{token}?uid={user_id}')
+    data, submit = request('POST', f'/pre-verify/{token}/submit', json.dumps(
+        {'user_id': user_id, 'interaction_time': 10, **solve_page(html)}))
+    if not json.loads(data)['success']:
+        raise RuntimeError(f'Submit failed: {data!r}')
+    return create, page, submit
+
+
+def run_load(host, port, flows, concurrency):
+    """Run flows across concurrency keep-alive clients. Returns a summary dict."""
+    local = threading.local()
+    errors = []
+
+    def worker(n):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(host, port, timeout=30)
+        try:
+            return run_flow(conn, n)
+        except (OSError, RuntimeError, http.client.HTTPException, ValueError) as e:
+            errors.append(repr(e))
+            conn.close()
+            local.conn = None
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [r for r in pool.map(worker, range(flows)) if r is not None]
+    elapsed = time.perf_counter() - start
+
+    summary = {'flows': len(results), 'errors': len(errors), 'seconds': elapsed,
+               'flows_per_sec': len(results) / elapsed, 'latency_ms': {}}
+    columns = list(zip(*results)) if results else [()] * len(STEPS)
+    series = dict(zip(STEPS, columns))
+    series['flow'] = [sum(r) for r in results]
+    for name, values in series.items():
+        values = sorted(values)
+        summary['latency_ms'][name] = {f'p{p}': percentile(values, p) * 1e3 for p in PERCENTILES}
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
+
+
+def print_summary(summary, out=sys.stdout):
+    out.write(f'{summary["flows"]} flows in {summary["seconds"]:.2f}s: {summary["flows_per_sec"]:,.1f} flows/sec, '
+              f'{summary["errors"]} errors\n')
+    out.write(f'{"step":<8}' + ''.join(f'{"p%d ms" % p:>10}' for p in PERCENTILES) + '\n')
+    for name, values in summary['latency_ms'].items():
+        out.write(f'{name:<8}' + ''.join(f'{values["p%d" % p]:>10.2f}' for p in PERCENTILES) + '\n')
+    if 'first_error' in summary:
+        out.write(f'first error: {summary["first_error"]}\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--flows', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--url', help='server to load instead of an in-process one')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        server = start_server()
+        host, port = server.server_address[:2]
+    try:
+        print_summary(run_load(host, port, args.flows, args.concurrency))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Replay a recorded traffic stream (see bot_verification/recording.py).
+
+Re-issues every recorded request at its recorded offset, divided by
+``--speed`` (1 = real time, 10 = ten times faster), from a pool of keep-alive
+clients. Tokens are re-minted so each request carries a validly signed token
+of the recorded age: expired links are still expired, refreshes and retries
+of one link reuse one token while its age matches, a ``replayed`` submission
+resends the token already submitted for that link and invalid links get a
+token with a broken signature. Submissions recorded as ``too_fast`` are sent
+with too short an interaction time and ``bad_challenge`` ones without a
+solved challenge.
+
+Reports throughput, latency percentiles per route, how far the clients fell
+behind the schedule (the sign the target is saturated) and how many
+responses had the recorded outcome.
+
+By default the api/ handlers are served in-process with the memory replay
+guard. ``--url`` targets a running instance instead, which must sign with
+the same SECRET_KEY/SECRET_KEYS as this process.
+
+Usage:
+    python benchmarks/replay_traffic.py traffic.ndjson [--speed 1] [--workers 64] [--url http://127.0.0.1:8000]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+# Keep the replay guard on so recorded `replayed` submissions are rejected again
+os.environ.setdefault('REPLAY_BACKEND', 'memory')
+
+from bench_keepalive import start_server
+from bench_load import PERCENTILES, percentile
+from bot_verification import challenge, tokens
+
+PAGE_OUTCOMES = {200: 'page_shown', 403: 'bad_signature', 404: 'invalid_url', 410: 'expired'}
+SUBMIT_MESSAGES = {
+    'Please wait for the full countdown': 'too_fast',
+    'This verification link has already been used': 'replayed',
+    'Invalid or expired verification link': 'rejected',
+    'Invalid request': 'invalid_request',
+    'Browser check failed, please reload the page': 'bad_challenge',
+}
+# A submission doesn't say why a token was rejected
+SUBMIT_OUTCOMES = {'bad_signature': 'rejected', 'expired': 'rejected'}
+
+
+def load_records(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r['t'])
+    return records
+
+
+class TokenMinter:
+    """Maps recorded token refs to fresh tokens of the recorded age."""
+
+    def __init__(self):
+        self._links = {}
+        self._submitted = {}
+        self._lock = threading.Lock()
+
+    def identity(self, ref):
+        """(user_id, shortener_link) for ref; requests recorded without a ref each get their own."""
+        with self._lock:
+            n = len(self._links)
+            if ref is None:
+                self._links[object()] = n
+            else:
+                n = self._links.setdefault(ref, n)
+        return str(7000000000 + n), f'https://linkshortify.com/replay{n:08x}'
+
+    def token(self, record):
+        ref = record.get('ref')
+        user_id, link = self.identity(ref)
+        if record.get('outcome') == 'replayed' and ref in self._submitted:
+            return user_id, self._submitted[ref]
+        if 'age' not in record:
+            # Recorded with an invalid token (or none): send one with a broken signature
+            token = tokens.encode(user_id, link, int(time.time()))
+            return user_id, token[:-2] + ('A' if token[-2] != 'A' else 'B') + token[-1]
+        # Same timestamp for the same ref and age, so refreshes reuse the token
+        return user_id, tokens.encode(user_id, link, int(time.time()) - record['age'])
+
+    def submitted(self, ref, token):
+        self._submitted[ref] = token
+
+
+def build_request(record, minter):
+    """Return (method, path, body) re-creating a recorded request."""
+    route = record['route']
+    if route == 'create_token':
+        user_id, link = minter.identity(record.get('ref'))
+        return 'POST', '/api/create-token', json.dumps({'user_id': user_id, 'shortener_link': link})
+    user_id, token = minter.token(record)
+    if route == 'verify_page':
+        return 'GET', f'/pre-verify/{token}?uid={user_id}', None
+    if record.get('ref') is not None:
+        minter.submitted(record['ref'], token)
+    interaction_time = 0 if record.get('outcome') == 'too_fast' else 10
+    # Solved here at difficulty 0 rather than fetching the page; the server accepts any difficulty it signed
+    pow_challenge = challenge.issue(token, 0)
+    pow_nonce = None if record.get('outcome') == 'bad_challenge' else challenge.solve(pow_challenge)
+    return 'POST', f'/pre-verify/{token}/submit', json.dumps(
+        {'user_id': user_id, 'interaction_time': interaction_time,
+         'pow_challenge': pow_challenge, 'pow_nonce': pow_nonce})
+
+
+def observed_outcome(route, status, body):
+    """Outcome implied by a response (JSON bodies are small enough never to be compressed)."""
+    if route == 'verify_page':
+        return PAGE_OUTCOMES.get(status, str(status))
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return str(status)
+    if data.get('success'):
+        return 'success'
+    return SUBMIT_MESSAGES.get(data.get('message'), 'error') if route == 'verify_submit' else 'error'
+
+
+def replay(records, host, port, speed, workers):
+    """Replay records against host:port. Returns a summary dict."""
+    minter = TokenMinter()
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    lags = []
+    matched = defaultdict(lambda: [0, 0])
+    errors = []
+
+    def send(record, due, previous):
+        if previous is not None:
+            # Keep requests for one link in recorded order (a refresh after its submit, ...)
+            previous.result()
+        lag = time.perf_counter() - due
+        method, path, body = build_request(record, minter)
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': record.get('enc', 'identity')}
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(host, port, timeout=30)
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            local.conn = None
+            errors.append(repr(e))
+            return
+        elapsed = time.perf_counter() - start
+        route = record['route']
+        outcome = record.get('outcome')
+        seen = observed_outcome(route, response.status, data)
+        with lock:
+            latencies[route].append(elapsed)
+            lags.append(lag)
+            counts = matched[route]
+            counts[1] += 1
+            if route == 'verify_submit':
+                outcome = SUBMIT_OUTCOMES.get(outcome, outcome)
+            if outcome is None or outcome == seen:
+                counts[0] += 1
+
+    t0 = records[0]['t']
+    last = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for record in records:
+            due = start + (record['t'] - t0) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ref = record.get('ref')
+            future = pool.submit(send, record, due, last.get(ref))
+            if ref is not None:
+                last[ref] = future
+    elapsed = time.perf_counter() - start
+
+    lags.sort()
+    summary = {
+        'requests': sum(len(v) for v in latencies.values()),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'recorded_seconds': records[-1]['t'] - t0,
+        'lag_ms': {f'p{p}': percentile(lags, p) * 1e3 for p in PERCENTILES},
+        'routes': {},
+    }
+    summary['requests_per_sec'] = summary['requests'] / elapsed
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        summary['routes'][route] = {
+            'requests': len(values),
+            'matched': matched[route][0],
+            'latency_ms': {f'p{p}': percentile(values, p) * 1e3 for p in PERCENTILES},
+        }
+    if errors:
+        summary['first_error'] = errors[0]
+    return summary
+
+
+def print_summary(summary, speed):
+    print(f'{summary["requests"]} requests in {summary["seconds"]:.2f}s '
+          f'({summary["recorded_seconds"]:.1f}s recorded, {speed:g}x): '
+          f'{summary["requests_per_sec"]:,.1f} req/sec, {summary["errors"]} errors')
+    lag = summary['lag_ms']
+    print('behind schedule ms  ' + '  '.join(f'p{p} {lag["p%d" % p]:.2f}' for p in PERCENTILES))
+    print(f'{"route":<15} {"requests":>9} {"outcome ok":>11}' + ''.join(f'{"p%d ms" % p:>10}' for p in PERCENTILES))
+    for route, stats in summary['routes'].items():
+        print(f'{route:<15} {stats["requests"]:>9} {stats["matched"]:>11}'
+              + ''.join(f'{stats["latency_ms"]["p%d" % p]:>10.2f}' for p in PERCENTILES))
+    if 'first_error' in summary:
+        print(f'first error: {summary["first_error"]}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='NDJSON file written with RECORD_TRAFFIC')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed-up (default 1)')
+    parser.add_argument('--workers', type=int, default=64, help='concurrent clients')
+    parser.add_argument('--url', help='instance to replay against instead of an in-process one')
+    args = parser.parse_args(argv)
+
+    records = [r for r in load_records(args.path) if r.get('route') in ('create_token', 'verify_page', 'verify_submit')]
+    if not records:
+        parser.error(f'no records in {args.path}')
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        server = start_server()
+        host, port = server.server_address[:2]
+    try:
+        print_summary(replay(records, host, port, args.speed, args.workers), args.speed)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
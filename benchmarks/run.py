@@ -0,0 +1,195 @@
+"""
+Benchmark suite: token and page micro-benchmarks plus an end-to-end load test.
+
+Runs each benchmark, writes a report to ``bench_output.txt`` in the repository
+root and compares the results with a stored baseline (``benchmarks/baseline.json``
+by default). A result more than ``--tolerance`` worse than its baseline
+(``--load-tolerance`` for the noisier load test) is flagged as a regression
+and the exit status is 1.
+
+Baselines only mean something on the machine and Python they were recorded
+with; record your own before comparing (``--save-baseline``). The report notes
+when the baseline came from a different platform.
+
+Usage:
+    python benchmarks/run.py [--quick] [--tolerance 0.2] [--baseline PATH] [--save-baseline]
+                             [--flows 2000] [--concurrency 16] [--skip-load]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+
+from bench_load import print_summary, run_load
+from bench_keepalive import start_server
+from bench_render import load_handler_module
+from bench_tokens import rate
+from bot_verification import tokens
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+OUTPUT = os.path.join(ROOT, 'bench_output.txt')
+
+HIGHER, LOWER = 'higher', 'lower'
+
+
+def micro_benchmarks(count):
+    """Return {name: (ops/sec, HIGHER)} for the codec and page rendering."""
+    verify = load_handler_module('verify')
+    now = int(time.time())
+    items = [(str(5000000000 + i), f'https://linkshortify.com/{i:08x}') for i in range(count)]
+    minted = [tokens.encode(user_id, link, now) for user_id, link in items]
+    tampered = [t[:-2] + ('A' if t[-2] != 'A' else 'B') + t[-1] for t in minted]
+    _, signer = tokens.default_keyring.signer_for()
+    body = tokens._b64decode(minted[0] + '=' * (-len(minted[0]) % 4))[:-tokens.MAC_SIZE]
+    headers = {'accept-encoding': 'gzip, deflate, br'}
+    paths = [f'/pre-verify/{t}?uid={user_id}' for t, (user_id, _) in zip(minted, items)]
+
+    def encode():
+        for user_id, link in items:
+            tokens.encode(user_id, link, now)
+
+    def decode():
+        for token in minted:
+            tokens.decode(token)
+
+    def reject():
+        for token in tampered:
+            tokens.decode(token)
+
+    def signature():
+        mac = signer.mac
+        for _ in range(count):
+            mac(body)
+
+    def render():
+        for token in minted:
+            b''.join(verify.render_verification_page(token, now, 'pre-verify'))
+
+    def page():
+        for path in paths:
+            verify.handle_get(path, headers)
+
+    return {
+        'token_encode': (rate(encode, count), HIGHER),
+        'token_decode': (rate(decode, count), HIGHER),
+        'token_reject_bad_signature': (rate(reject, count), HIGHER),
+        'signature_check': (rate(signature, count), HIGHER),
+        'render_verify_page': (rate(render, count), HIGHER),
+        'verify_page_response': (rate(page, count), HIGHER),
+    }
+
+
+def load_benchmark(flows, concurrency):
+    """Return ({name: (value, direction)}, summary) for the end-to-end flow."""
+    server = start_server()
+    try:
+        host, port = server.server_address[:2]
+        run_load(host, port, min(flows, 200), concurrency)  # warm up
+        summary = run_load(host, port, flows, concurrency)
+    finally:
+        server.shutdown()
+    results = {'load_flows_per_sec': (summary['flows_per_sec'], HIGHER)}
+    for p, value in summary['latency_ms']['flow'].items():
+        results[f'load_flow_{p}_ms'] = (value, LOWER)
+    results['load_errors'] = (summary['errors'], LOWER)
+    return results, summary
+
+
+def machine():
+    return {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+
+
+def compare(results, baseline, tolerance, load_tolerance):
+    """Return rows of (name, value, base, change, regressed) for every result."""
+    rows = []
+    for name, (value, direction) in results.items():
+        base = baseline.get(name, {}).get('value')
+        if base is None:
+            rows.append((name, value, None, None, False))
+            continue
+        change = (value - base) / base if base else (float('inf') if value else 0.0)
+        worse = -change if direction == HIGHER else change
+        # Errors are counts that should stay at zero, so any increase is a regression
+        allowed = load_tolerance if name.startswith('load_') else tolerance
+        regressed = value > base if name == 'load_errors' else worse > allowed
+        rows.append((name, value, base, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help='items per micro-benchmark run')
+    parser.add_argument('--flows', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--quick', action='store_true', help='smaller runs, for a smoke test')
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown (default 0.2)')
+    parser.add_argument('--load-tolerance', type=float, default=0.5,
+                        help='allowed relative slowdown for the noisier load-test results (default 0.5)')
+    parser.add_argument('--output', default=OUTPUT)
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.count, args.flows = 2000, 300
+
+    results = micro_benchmarks(args.count)
+    summary = None
+    if not args.skip_load:
+        load_results, summary = load_benchmark(args.flows, args.concurrency)
+        results.update(load_results)
+
+    baseline = {}
+    baseline_machine = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored['results']
+        baseline_machine = stored.get('machine')
+
+    rows = compare(results, baseline, args.tolerance, args.load_tolerance)
+    lines = [f'Benchmark run {time.strftime("%Y-%m-%d %H:%M:%S")} on {machine()["platform"]}, '
+             f'Python {machine()["python"]}', '']
+    if baseline_machine and baseline_machine != machine():
+        lines += [f'Note: baseline recorded on {baseline_machine["platform"]}, Python {baseline_machine["python"]}; '
+                  'differences may not be regressions.', '']
+    lines.append(f'{"benchmark":<28} {"value":>14} {"baseline":>14} {"change":>8}')
+    for name, value, base, change, regressed in rows:
+        unit = '' if name.startswith('load_') else ' /s'
+        base_text = '-' if base is None else f'{base:,.2f}'
+        change_text = '-' if change is None else f'{change:+.1%}'
+        flag = '  REGRESSION' if regressed else ''
+        lines.append(f'{name:<28} {value:>12,.2f}{unit:<2} {base_text:>14} {change_text:>8}{flag}')
+    regressions = [row[0] for row in rows if row[4]]
+    lines += ['', f'{len(regressions)} regression(s): {", ".join(regressions)}'
+              if regressions else 'No regressions.' if baseline else 'No baseline to compare with.']
+    report = '\n'.join(lines) + '\n'
+
+    with open(args.output, 'w') as f:
+        f.write(report)
+        if summary is not None:
+            f.write(f'\nLoad test ({args.concurrency} concurrent clients)\n')
+            print_summary(summary, f)
+    sys.stdout.write(report)
+
+    if args.save_baseline:
+        stored = {'machine': machine(), 'recorded': int(time.time()),
+                  'results': {name: {'value': value, 'better': direction}
+                              for name, (value, direction) in results.items()}}
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2)
+            f.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
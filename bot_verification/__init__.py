@@ -0,0 +1,11 @@
+"""Shared code for the bot verification service handlers in ``api/``."""
+
+
+def warn(name, message, *args):
+    """Log a warning on the logger called name.
+
+    logging is imported here, on first use, rather than by every module that
+    might warn: it costs a cold start several milliseconds and is rarely needed.
+    """
+    import logging
+    logging.getLogger(name).warning(message, *args)
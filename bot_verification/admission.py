@@ -0,0 +1,268 @@
+"""
+Admission control for the token endpoints: rate limits and load shedding.
+
+Requests to the verify page, the submit endpoint and ``/api/create-token``
+pass three checks before the handler runs:
+
+1. A token bucket per client IP (``ADMISSION_IP_RATE`` requests/sec, bursts
+   of ``ADMISSION_IP_BURST``) on the routes in ``ADMISSION_IP_ROUTES``
+   (default ``verify_page,verify_submit``). ``/api/create-token`` is left
+   out by default because a bot's broadcast comes from one address; add
+   ``create_token`` to limit it too, and list the bot's server in
+   ``ADMISSION_EXEMPT`` (default loopback), whose addresses skip this check.
+
+   The IP is the socket peer unless ``ADMISSION_IP_HEADER`` names a header
+   set by a proxy in front (default ``x-real-ip`` on Vercel, where the edge
+   sets it, and none elsewhere, since any client can send the header). Then
+   the rightmost address in that header not in ``ADMISSION_TRUSTED_PROXIES``
+   is used, and with trusted proxies configured the header is only read on
+   connections from one of them.
+2. A token bucket per user id (``ADMISSION_UID_RATE``/``ADMISSION_UID_BURST``)
+   for verification requests. Only tokens with a valid signature are
+   charged to their user id, so a forged token can't exhaust someone
+   else's bucket; checking the MAC is cheap next to rendering or a replay
+   lookup.
+3. At most ``ADMISSION_MAX_CONCURRENT`` requests in the handlers at once;
+   beyond that requests are shed with a 503 instead of queueing until every
+   response is late.
+
+Rejections are precomputed responses: 429 with ``Retry-After`` for rate
+limits (JSON for submissions, so the page can show it) and 503 for shedding.
+Decisions are counted in ``botverify_admission_decisions_total``.
+
+Buckets live in bounded tables (``ADMISSION_TABLE_SIZE`` entries each, least
+recently used dropped first). An entry idle long enough to have refilled is
+no different from a new one, so it is dropped at that point. A rate of 0
+disables that limit; ``ADMISSION=off`` disables admission control. Limits
+are per process, like the metrics.
+"""
+
+import functools
+import ipaddress
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+from . import metrics, tokens
+from .responses import Response, peer_address
+
+MAX_RETRY_AFTER = 60
+
+
+class BucketTable:
+    """Token buckets keyed by client, in a bounded table with LRU and idle eviction."""
+
+    def __init__(self, rate, burst, maxsize=100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        # A bucket idle this long is full again, the same as a new one
+        self.idle_ttl = burst / rate
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def take(self, key, now=None):
+        """Take one token for key. Returns 0 if there was one, else seconds until there is."""
+        now = monotonic() if now is None else now
+        with self._lock:
+            entries = self._entries
+            entry = entries.get(key)
+            if entry is None:
+                stale = now - self.idle_ttl
+                while entries:
+                    oldest = next(iter(entries.values()))
+                    if oldest[1] > stale and len(entries) < self.maxsize:
+                        break
+                    entries.popitem(last=False)
+                entries[key] = [self.burst - 1, now]
+                return 0
+            entries.move_to_end(key)
+            available = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            entry[1] = now
+            if available >= 1:
+                entry[0] = available - 1
+                return 0
+            entry[0] = available
+            return (1 - available) / self.rate
+
+
+class AddressSet:
+    """IP addresses and networks (``'10.0.0.1'``, ``'10.0.0.0/8'``), tested with ``in``."""
+
+    def __init__(self, specs=()):
+        networks = [ipaddress.ip_network(spec, strict=False) for spec in specs]
+        self._hosts = {str(net.network_address) for net in networks if net.num_addresses == 1}
+        self._networks = [net for net in networks if net.num_addresses > 1]
+
+    def __bool__(self):
+        return bool(self._hosts or self._networks)
+
+    def __contains__(self, ip):
+        if ip in self._hosts:
+            return True
+        if not self._networks:
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in net for net in self._networks)
+
+
+def _rejection(status, retry_after, message, as_json):
+    if as_json:
+        content_type, body = 'application/json', json.dumps({'success': False, 'message': message}).encode()
+    else:
+        content_type, body = 'text/plain; charset=utf-8', message.encode()
+    return Response(status, [
+        ('Content-type', content_type),
+        ('Retry-After', str(retry_after)),
+        ('Cache-Control', 'no-store'),
+        ('Access-Control-Allow-Origin', '*'),
+        ('Content-Length', str(len(body))),
+    ], body)
+
+
+# [as_json][retry_after] for 1..MAX_RETRY_AFTER seconds
+TOO_MANY_REQUESTS = [
+    [None] + [_rejection(429, s, f'Too many requests, please try again in {s} second{"s" if s > 1 else ""}', as_json)
+              for s in range(1, MAX_RETRY_AFTER + 1)]
+    for as_json in (False, True)
+]
+OVERLOADED = [_rejection(503, 1, 'Server busy, please try again in a moment', as_json) for as_json in (False, True)]
+
+
+def too_many_requests(wait, as_json):
+    """Precomputed 429 telling the client to retry after wait seconds."""
+    return TOO_MANY_REQUESTS[as_json][min(MAX_RETRY_AFTER, max(1, math.ceil(wait)))]
+
+
+def token_uid(path):
+    """User id of the token in a /pre-verify/TOKEN[/submit] path, or None unless its signature is valid."""
+    parts = path.split('/', 3)
+    if len(parts) < 3:
+        return None
+    return tokens.decode(parts[2].split('?', 1)[0])[0]
+
+
+class Admission:
+    """Per-IP and per-uid rate limits plus a concurrency limit; see the module docstring."""
+
+    def __init__(self, ip_buckets=None, uid_buckets=None, max_concurrent=0, ip_header=None, exempt=(),
+                 trusted_proxies=(), ip_routes=('verify_page', 'verify_submit')):
+        self.ip_buckets = ip_buckets
+        self.uid_buckets = uid_buckets
+        self.max_concurrent = max_concurrent
+        self.ip_header = ip_header
+        self.exempt = AddressSet(exempt)
+        self.trusted_proxies = AddressSet(trusted_proxies)
+        self.ip_routes = frozenset(ip_routes)
+        # One entry per free slot; list pop/append are atomic, so no lock is needed
+        self._slots = [None] * max_concurrent if max_concurrent > 0 else None
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Admission configured from ADMISSION_* variables, or None if it is off."""
+        if environ.get('ADMISSION', '').lower() in ('off', '0', 'false'):
+            return None
+        size = int(environ.get('ADMISSION_TABLE_SIZE') or 100000)
+
+        def buckets(name, rate, burst):
+            rate = float(environ.get(f'ADMISSION_{name}_RATE') or rate)
+            burst = float(environ.get(f'ADMISSION_{name}_BURST') or burst)
+            return BucketTable(rate, max(1.0, burst), size) if rate > 0 else None
+
+        def names(name, default):
+            return [item.strip() for item in environ.get(name, default).split(',') if item.strip()]
+
+        # The Vercel runtime sets VERCEL; its edge overwrites x-real-ip with the client's address
+        ip_header = environ.get('ADMISSION_IP_HEADER', 'x-real-ip' if environ.get('VERCEL') else '')
+        return cls(
+            ip_buckets=buckets('IP', 10, 40),
+            uid_buckets=buckets('UID', 1, 10),
+            max_concurrent=int(environ.get('ADMISSION_MAX_CONCURRENT') or 64),
+            ip_header=ip_header.strip().lower() or None,
+            exempt=names('ADMISSION_EXEMPT', '127.0.0.1,::1'),
+            trusted_proxies=names('ADMISSION_TRUSTED_PROXIES', ''),
+            ip_routes=names('ADMISSION_IP_ROUTES', 'verify_page,verify_submit'),
+        )
+
+    def client_ip(self, headers):
+        """The client's address: the socket peer, or what a trusted proxy put in ip_header."""
+        address = peer_address()
+        peer = address[0] if address else None
+        if self.ip_header is None or (self.trusted_proxies and peer not in self.trusted_proxies):
+            return peer
+        forwarded = headers.get(self.ip_header)
+        if not forwarded:
+            return peer
+        # Proxies append, so the entries left of the last untrusted one are whatever the client sent
+        for ip in reversed(forwarded.split(',')):
+            ip = ip.strip()
+            if ip not in self.trusted_proxies:
+                return ip
+        return peer
+
+    def is_exempt(self, ip):
+        return ip in self.exempt
+
+    def admitted(self, route, uid_from=None, as_json=False):
+        """Decorate a handle_* function with the checks. Rejections are JSON if as_json, else plain text."""
+        decision = metrics.ADMISSION_DECISIONS.labels
+        admitted, limited_ip = decision(route, 'admitted'), decision(route, 'limited_ip')
+        limited_uid, shed = decision(route, 'limited_uid'), decision(route, 'shed')
+        ip_buckets = self.ip_buckets if route in self.ip_routes else None
+        uid_buckets = self.uid_buckets if uid_from is not None else None
+        slots = self._slots
+        take_slot = slots.pop if slots is not None else None
+        free_slot = slots.append if slots is not None else None
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(path, headers, *args):
+                now = monotonic()
+                if ip_buckets is not None:
+                    ip = self.client_ip(headers)
+                    if ip is not None and not self.is_exempt(ip):
+                        wait = ip_buckets.take(ip, now)
+                        if wait:
+                            limited_ip.inc()
+                            return too_many_requests(wait, as_json)
+                if uid_buckets is not None:
+                    uid = uid_from(path)
+                    if uid is not None:
+                        wait = uid_buckets.take(uid, now)
+                        if wait:
+                            limited_uid.inc()
+                            return too_many_requests(wait, as_json)
+                if slots is None:
+                    admitted.inc()
+                    return func(path, headers, *args)
+                try:
+                    take_slot()
+                except IndexError:
+                    shed.inc()
+                    return OVERLOADED[as_json]
+                try:
+                    admitted.inc()
+                    return func(path, headers, *args)
+                finally:
+                    free_slot(None)
+            return wrapper
+        return decorator
+
+
+admission = Admission.from_env()
+
+
+def admitted(route, uid_from=None, as_json=False):
+    """Apply the process-wide admission checks to a handle_* function (unchanged when off)."""
+    if admission is None:
+        return lambda func: func
+    return admission.admitted(route, uid_from, as_json)
@@ -0,0 +1,316 @@
+"""
+asyncio version of the ``api/`` endpoints: an ASGI application plus a minimal
+HTTP/1.1 server to run it without third-party packages::
+
+    python -m bot_verification.asgi --port 8000
+
+The app routes with ``vercel.json`` like :mod:`.server` does and calls the
+same request functions the ``BaseHTTPRequestHandler`` classes call
+(``handle_get``, ``handle_post`` and ``handle_options`` in each api module),
+so the responses are identical. Those functions only do CPU work and run on
+the event loop. A connection that is waiting on a slow client therefore costs
+a coroutine rather than a thread. Endpoints without them, such as the
+streaming ``/api/create-tokens``, answer 501 here and stay on the threaded
+server.
+
+``app`` also runs under any ASGI server (``uvicorn bot_verification.asgi:app``).
+The sqlite and redis replay backends block the loop for one round trip per
+submission.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+
+from . import bodies
+from .responses import (BAD_LENGTH, BODY_TIMED_OUT, BODY_TOO_LARGE, LENGTH_REQUIRED, Response,
+                        set_peer_address)
+from .server import DEFAULT_CONFIG, Router, load_module
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 16 * 1024
+# For routes whose module doesn't declare its own MAX_BODY_SIZE
+MAX_BODY_SIZE = 1 << 20
+# Seconds a client gets to send a complete request head (or, between requests, to start one)
+IDLE_TIMEOUT = 15
+
+_REASONS = {status.value: status.phrase.encode() for status in HTTPStatus}
+
+
+def _plain(status, message):
+    body = message.encode()
+    return Response(status, [('Content-type', 'text/plain'), ('Content-Length', str(len(body)))], body)
+
+
+class App:
+    """ASGI application serving the api/ modules routed by vercel.json."""
+
+    def __init__(self, router, modules):
+        self.router = router
+        self.modules = modules
+
+    @classmethod
+    def from_config(cls, path=DEFAULT_CONFIG):
+        router = Router.from_config(path)
+        loaded = {}
+        for dest in router.targets:
+            if dest not in loaded:
+                loaded[dest] = load_module(dest, os.path.dirname(path))
+        return cls(router, [loaded[dest] for dest in router.targets])
+
+    def max_body_size(self, path):
+        """Largest request body accepted for path: its module's MAX_BODY_SIZE, if declared."""
+        index = self.router.match(path.split('?', 1)[0])
+        if index is None:
+            return MAX_BODY_SIZE
+        return getattr(self.modules[index], 'MAX_BODY_SIZE', MAX_BODY_SIZE)
+
+    def respond(self, method, path, headers, body):
+        """Build the Response for one request; headers maps lower-case names to values."""
+        index = self.router.match(path.split('?', 1)[0])
+        if index is None:
+            return _plain(404, 'Not found')
+        func = getattr(self.modules[index], 'handle_' + ('get' if method == 'HEAD' else method.lower()), None)
+        if func is None:
+            return _plain(501, f'Unsupported method ({method!r})')
+        try:
+            if method == 'POST':
+                return func(path, headers, body)
+            return func(path, headers)
+        except Exception:
+            logger.exception('Error handling %s %s', method, path)
+            return _plain(500, 'Internal server error')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported scope type: {scope["type"]}')
+
+        path = (scope.get('raw_path') or scope['path'].encode()).decode('latin-1')
+        if scope.get('query_string'):
+            path += '?' + scope['query_string'].decode('latin-1')
+        limit = self.max_body_size(path)
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > limit:
+                response = BODY_TOO_LARGE
+                break
+            chunks.append(chunk)
+            more_body = message.get('more_body', False)
+        else:
+            headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+            set_peer_address(scope.get('client'))
+            response = self.respond(scope['method'], path, headers, b''.join(chunks))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else response.body})
+
+
+_date = [0, b'']
+
+
+def _date_header():
+    now = int(time.time())
+    if now != _date[0]:
+        _date[:] = [now, formatdate(now, usegmt=True).encode()]
+    return _date[1]
+
+
+def _simple_reply(writer, status):
+    reason = _REASONS.get(status, b'')
+    writer.write(b'HTTP/1.1 %d %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s'
+                 % (status, reason, len(reason), reason))
+
+
+def _refuse_body(writer, response):
+    """Send one of the shared body rejections and close: the unread body can't be skipped."""
+    out = [b'HTTP/1.1 %d %s\r\n' % (response.status, _REASONS.get(response.status, b''))]
+    out.extend(f'{name}: {value}\r\n'.encode('latin-1') for name, value in response.headers)
+    out.append(b'Connection: close\r\n\r\n')
+    out.append(response.body)
+    writer.write(b''.join(out))
+
+
+async def _call_app(app, scope, body):
+    """Run app for one request. Returns (status, headers, body)."""
+    received = False
+    result = [500, [], []]
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {'type': 'http.disconnect'}
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result[0] = message['status']
+            result[1] = message.get('headers', [])
+        elif message['type'] == 'http.response.body':
+            result[2].append(message.get('body', b''))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        logger.exception('ASGI application error')
+        return 500, [], b''
+    return result[0], result[1], b''.join(result[2])
+
+
+async def handle_connection(app, reader, writer):
+    """Serve HTTP/1.1 requests on one connection until it closes, idles out or misbehaves."""
+    client = writer.get_extra_info('peername')
+    server = writer.get_extra_info('sockname')
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT)
+            except asyncio.LimitOverrunError:
+                _simple_reply(writer, 431)
+                break
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                break
+
+            request_line, *lines = head[:-4].split(b'\r\n')
+            try:
+                method, target, version = request_line.decode('latin-1').split(' ')
+                headers = []
+                for line in lines:
+                    name, sep, value = line.partition(b':')
+                    if not sep:
+                        raise ValueError(line)
+                    headers.append((name.strip().lower(), value.strip()))
+                fields = dict(headers)
+            except ValueError:
+                _simple_reply(writer, 400)
+                break
+            length = fields.get(b'content-length') or b'0'
+            if b'transfer-encoding' in fields:
+                _refuse_body(writer, LENGTH_REQUIRED)
+                break
+            if not (length.isascii() and length.isdigit()):
+                # int() would also take '-5', '+5' and '1_0'
+                _refuse_body(writer, BAD_LENGTH)
+                break
+            length = int(length)
+            if length > (app.max_body_size(target) if isinstance(app, App) else MAX_BODY_SIZE):
+                _refuse_body(writer, BODY_TOO_LARGE)
+                break
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), bodies.BODY_TIMEOUT) if length else b''
+            except asyncio.TimeoutError:
+                _refuse_body(writer, BODY_TIMED_OUT)
+                break
+
+            connection = fields.get(b'connection', b'').lower()
+            keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0', 'spec_version': '2.3'},
+                'http_version': version[5:],
+                'method': method,
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'),
+                'root_path': '',
+                'headers': headers,
+                'client': client,
+                'server': server,
+            }
+            status, out_headers, out_body = await _call_app(app, scope, body)
+
+            out = [b'HTTP/1.1 %d %s\r\nDate: %s\r\n' % (status, _REASONS.get(status, b''), _date_header())]
+            has_length = False
+            for name, value in out_headers:
+                has_length = has_length or name == b'content-length'
+                out.append(b'%s: %s\r\n' % (name, value))
+            if not has_length and status >= 200 and status not in (204, 304):
+                out.append(b'content-length: %d\r\n' % len(out_body))
+            if not keep_alive:
+                out.append(b'connection: close\r\n')
+            out.append(b'\r\n')
+            if method != 'HEAD':
+                out.append(out_body)
+            writer.write(b''.join(out))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(app, host='127.0.0.1', port=8000, backlog=1024, ready=None):
+    """Serve app until SIGTERM/SIGINT (or until cancelled)."""
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(app, reader, writer),
+        host, port, backlog=backlog, limit=MAX_HEADER_SIZE,
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass  # not on the main thread, or not supported on this platform
+    if ready is not None:
+        ready(server)
+    async with server:
+        await stop.wait()
+
+
+def __getattr__(name):
+    # Build the module-level ``app`` for ASGI servers on first access only
+    if name == 'app':
+        global app
+        app = App.from_config()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the api/ endpoints from one asyncio event loop.')
+    parser.add_argument('--host', default=os.getenv('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    parser.add_argument('--backlog', type=int, default=1024)
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='path to vercel.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    application = App.from_config(os.path.abspath(args.config))
+    print(f'Serving on http://{args.host}:{args.port} (asyncio, pid {os.getpid()})', flush=True)
+    asyncio.run(serve(application, args.host, args.port, args.backlog))
+
+
+if __name__ == '__main__':
+    main()
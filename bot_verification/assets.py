@@ -0,0 +1,66 @@
+"""
+Fingerprinted static assets (CSS/JS shared by every page).
+
+Files in ``bot_verification/static/`` are loaded once at import time and
+published under a content-hashed URL such as ``/static/verify.1a2b3c4d5e.css``.
+Because the URL changes whenever the content does, responses can be cached
+forever (``Cache-Control: immutable``) by browsers and the CDN, and the
+per-token HTML only has to carry the token-specific values.
+"""
+
+import hashlib
+import os
+
+from .compression import Precompressed
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+URL_PREFIX = '/static/'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+
+class Asset:
+    """A static file with its fingerprinted URL, ETag and precompressed variants."""
+
+    __slots__ = ('name', 'url', 'body', 'etag', 'content_type')
+
+    def __init__(self, name, body):
+        digest = hashlib.sha256(body).hexdigest()[:10]
+        stem, ext = os.path.splitext(name)
+        self.name = name
+        self.url = f'{URL_PREFIX}{stem}.{digest}{ext}'
+        self.body = Precompressed(body)
+        self.etag = f'"{digest}"'
+        self.content_type = CONTENT_TYPES.get(ext, 'application/octet-stream')
+
+
+def _load_assets():
+    assets = {}
+    for name in sorted(os.listdir(STATIC_DIR)):
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            assets[name] = Asset(name, f.read())
+    return assets
+
+
+BY_NAME = _load_assets()
+BY_URL = {asset.url: asset for asset in BY_NAME.values()}
+
+
+def url(name):
+    """Fingerprinted URL of the static file name, e.g. url('verify.css')."""
+    return BY_NAME[name].url
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate == etag or candidate == 'W/' + etag:
+            return True
+    return False
@@ -0,0 +1,70 @@
+"""
+Request bodies of the small JSON endpoints: size caps and parsing.
+
+Each api module with a POST handler declares ``MAX_BODY_SIZE``.
+:meth:`.responses.BaseHandler.read_body` and the ASGI app refuse larger
+bodies before reading them, and the threaded handlers give a client
+``BODY_TIMEOUT`` seconds in total to send one. The socket timeout alone only
+bounds the gap between two bytes. ``/api/create-tokens`` takes batches of up
+to ``CREATE_TOKENS_MAX_BYTES``, and NDJSON ones are read line by line with
+:meth:`.responses.BaseHandler.read_body_lines`. Both get
+``BATCH_BODY_TIMEOUT`` seconds.
+
+:func:`parse_submit` and :func:`parse_create` match the exact bytes the
+verify page and the bot helpers send (``JSON.stringify`` or ``json.dumps``
+output with plain strings) and build the fields straight from the match,
+without decoding the body to a str or running the JSON decoder. Any other
+JSON object takes ``json.loads``. Anything that isn't a JSON object, or
+nests deeper than the decoder allows, is None, which the handlers answer
+with an 'Invalid request' rejection.
+"""
+
+import json
+import re
+
+MAX_SUBMIT_SIZE = 1024
+MAX_CREATE_SIZE = 4096
+BODY_TIMEOUT = 5
+BATCH_BODY_TIMEOUT = 30
+
+# A JSON string without escapes or control characters
+_STRING = rb'"([^"\\\x00-\x1f]*)"'
+
+_SUBMIT = re.compile(
+    rb'\{"user_id": ?%s, ?"interaction_time": ?(\d{1,9}), ?"pow_challenge": ?%s, ?"pow_nonce": ?%s\}'
+    % (_STRING, _STRING, _STRING))
+_CREATE = re.compile(rb'\{"user_id": ?%s, ?"shortener_link": ?%s(?:, ?"bot": ?%s)?\}' % (_STRING, _STRING, _STRING))
+
+
+def _loads(body):
+    try:
+        data = json.loads(body.decode())
+    except (ValueError, RecursionError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_submit(body):
+    """Fields of a verification submission, as a dict, or None if body isn't a JSON object."""
+    match = _SUBMIT.fullmatch(body)
+    if match is None:
+        return _loads(body)
+    user_id, interaction_time, pow_challenge, pow_nonce = match.groups()
+    try:
+        return {'user_id': user_id.decode(), 'interaction_time': int(interaction_time),
+                'pow_challenge': pow_challenge.decode(), 'pow_nonce': pow_nonce.decode()}
+    except UnicodeDecodeError:
+        return None
+
+
+def parse_create(body):
+    """Fields of a create-token request, as a dict, or None if body isn't a JSON object."""
+    match = _CREATE.fullmatch(body)
+    if match is None:
+        return _loads(body)
+    user_id, shortener_link, bot = match.groups()
+    try:
+        return {'user_id': user_id.decode(), 'shortener_link': shortener_link.decode(),
+                'bot': bot.decode() if bot is not None else None}
+    except UnicodeDecodeError:
+        return None
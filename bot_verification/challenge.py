@@ -0,0 +1,133 @@
+"""
+Proof-of-work challenge for verification submissions.
+
+The verification page carries a challenge bound to its token::
+
+    difficulty.kid.mac        mac = HMAC(key kid, "pow:difficulty.kid:token")[:12], base64url
+
+The browser searches for a nonce such that ``SHA-256(challenge + ":" + nonce)``
+starts with ``difficulty`` zero bits (about ``2 ** difficulty`` hashes) and
+sends both with the submission. Nothing is stored: the server recomputes the
+MAC to know it issued that challenge for that token at that difficulty, then
+hashes once to check the work. A script that posts straight to ``/submit``
+without solving is turned away before its token is even decoded.
+
+The difficulty is ``POW_DIFFICULTY`` (default 14 bits, well under a second in
+a browser and solved during the countdown). Once this process's page and
+submit rate exceeds ``POW_RATE_THRESHOLD`` requests/sec it gains a bit, and
+another for each doubling beyond, up to ``POW_MAX_DIFFICULTY`` (default 19,
+a few seconds). Under a flood every new page costs the client more while the
+server's check stays the same. A page keeps the difficulty it was first
+rendered with, also when served from the CDN.
+``POW_DIFFICULTY=0`` with ``POW_MAX_DIFFICULTY=0`` makes any nonce pass, but a
+signed challenge is still required.
+"""
+
+import base64
+import hashlib
+import itertools
+import math
+import os
+from hmac import compare_digest
+from time import monotonic
+
+from . import tokens
+
+BASE_DIFFICULTY = int(os.getenv('POW_DIFFICULTY', '14'))
+MAX_DIFFICULTY = min(32, max(BASE_DIFFICULTY, int(os.getenv('POW_MAX_DIFFICULTY', '19'))))
+RATE_THRESHOLD = float(os.getenv('POW_RATE_THRESHOLD', '50'))
+
+# Challenge plus nonce stay within one SHA-256 block (55 bytes), which the page's solver relies on
+MAX_CHALLENGE_LENGTH = 24
+MAX_NONCE_LENGTH = 12
+
+
+class RateMeter:
+    """Requests per second, over the current or the last whole second.
+
+    Counts are plain integer updates without a lock; a concurrent update may
+    occasionally be lost, which only makes the estimate slightly low.
+    """
+
+    def __init__(self):
+        self._second = 0
+        self._count = 0
+        self._previous = 0
+
+    def hit(self):
+        """Count one request and return the rate including it."""
+        now = int(monotonic())
+        if now != self._second:
+            self._previous = self._count if now == self._second + 1 else 0
+            self._second = now
+            self._count = 0
+        self._count += 1
+        return max(self._count, self._previous)
+
+    def rate(self):
+        now = int(monotonic())
+        if now == self._second:
+            return max(self._count, self._previous)
+        return self._count if now == self._second + 1 else 0
+
+
+meter = RateMeter()
+
+
+def current_difficulty(rate=None):
+    """Difficulty in bits for new challenges at rate (default: the measured rate)."""
+    rate = meter.rate() if rate is None else rate
+    if rate <= RATE_THRESHOLD:
+        return BASE_DIFFICULTY
+    return min(MAX_DIFFICULTY, BASE_DIFFICULTY + int(math.log2(rate / RATE_THRESHOLD)) + 1)
+
+
+def _mac(signer, head, token):
+    return base64.urlsafe_b64encode(signer.digest(b'pow:%s:%s' % (head, token.encode()))[:12]).decode()
+
+
+# (difficulty, kid) -> (head, challenge prefix), a handful of entries
+_heads = {}
+
+
+def issue(token, difficulty=None, keyring=None):
+    """Challenge string for token at difficulty (default: current_difficulty())."""
+    rate = meter.hit()
+    if difficulty is None:
+        difficulty = BASE_DIFFICULTY if rate <= RATE_THRESHOLD else current_difficulty(rate)
+    kid, signer = (keyring or tokens.default_keyring).signer_for()
+    head = _heads.get((difficulty, kid))
+    if head is None:
+        head = _heads[difficulty, kid] = (b'%d.%d' % (difficulty, kid), '%d.%d.' % (difficulty, kid))
+    return head[1] + _mac(signer, head[0], token)
+
+
+def verify(token, challenge, nonce, keyring=None):
+    """True if challenge was issued for token and nonce solves it. O(1): one HMAC, one hash."""
+    meter.hit()
+    if not isinstance(challenge, str) or not isinstance(nonce, str):
+        return False
+    if len(challenge) > MAX_CHALLENGE_LENGTH or len(nonce) > MAX_NONCE_LENGTH or not challenge.isascii():
+        return False
+    head, _, mac = challenge.rpartition('.')
+    difficulty, _, kid = head.partition('.')
+    if not difficulty.isdigit() or not kid.isdigit() or int(difficulty) > 32 or int(kid) > tokens.MAX_KEY_ID:
+        return False
+    signer = (keyring or tokens.default_keyring).verifier(int(kid))
+    if signer is None or not compare_digest(mac, _mac(signer, head.encode(), token)):
+        return False
+    digest = hashlib.sha256(f'{challenge}:{nonce}'.encode()).digest()
+    return int.from_bytes(digest[:4], 'big') >> (32 - int(difficulty)) == 0
+
+
+def solve(challenge):
+    """Find a nonce for challenge, as the page does (for scripts, tests and benchmarks)."""
+    difficulty = int(challenge.partition('.')[0])
+    shift = 32 - difficulty
+    prefix = hashlib.sha256(f'{challenge}:'.encode())
+    for n in itertools.count():
+        nonce = str(n)
+        h = prefix.copy()
+        h.update(nonce.encode())
+        if int.from_bytes(h.digest()[:4], 'big') >> shift == 0:
+            return nonce
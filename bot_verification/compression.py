@@ -0,0 +1,202 @@
+"""
+Content-Encoding negotiation and compression.
+
+Static bodies (assets, the landing page, known error pages) are compressed
+once with the strongest settings and served as-is; dynamic bodies are
+compressed per request with cheap settings, and only above
+``MIN_DYNAMIC_SIZE`` where it actually saves a round-trip's worth of bytes.
+
+A static body is compressed the first time a client asks for each encoding,
+not at import, so a cold start only pays for what it serves. To take even
+that off cold starts, run ``python -m bot_verification.compression`` before
+deploying: it compresses every static body of the ``api/`` modules into
+``BUILD_DIR``, where they are found by content hash. Stale files are simply
+never found.
+
+Brotli is used when the optional ``brotli`` package is installed; otherwise
+only gzip is offered.
+"""
+
+import hashlib
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+MIN_DYNAMIC_SIZE = 1024
+STATIC_GZIP_LEVEL = 9
+DYNAMIC_GZIP_LEVEL = 1
+STATIC_BROTLI_QUALITY = 11
+DYNAMIC_BROTLI_QUALITY = 4
+
+# Server preference when the client rates several codings equally
+SUPPORTED = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'precompressed')
+
+_negotiated = {}
+_NEGOTIATION_CACHE_SIZE = 256
+
+
+def negotiate(accept_encoding):
+    """Pick 'br', 'gzip' or None (identity) for an Accept-Encoding header value."""
+    if not accept_encoding:
+        return None
+    result = _negotiated.get(accept_encoding, False)
+    if result is not False:
+        return result
+
+    qualities = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        qualities[coding.strip()] = q
+    wildcard = qualities.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in SUPPORTED:
+        q = qualities.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+
+    if len(_negotiated) >= _NEGOTIATION_CACHE_SIZE:
+        _negotiated.clear()
+    _negotiated[accept_encoding] = best
+    return best
+
+
+def gzip_compress(body, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress(body, encoding, static=False):
+    """Compress body with encoding ('br' or 'gzip')."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else DYNAMIC_BROTLI_QUALITY)
+    return gzip_compress(body, STATIC_GZIP_LEVEL if static else DYNAMIC_GZIP_LEVEL)
+
+
+def compress_dynamic(body, accept_encoding):
+    """Cheaply compress a per-request body if worthwhile. Returns (encoding or None, body)."""
+    if len(body) < MIN_DYNAMIC_SIZE:
+        return None, body
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return None, body
+    return encoding, compress(body, encoding)
+
+
+def _build_path(body, encoding):
+    return os.path.join(BUILD_DIR, f'{hashlib.sha256(body).hexdigest()[:24]}.{encoding}')
+
+
+class Precompressed:
+    """A static body together with its variants, each compressed on first use.
+
+    Every instance is kept in ``Precompressed.instances`` for :func:`build`.
+    """
+
+    __slots__ = ('variants',)
+    instances = []
+
+    def __init__(self, body):
+        self.variants = {None: body}
+        Precompressed.instances.append(self)
+
+    @property
+    def identity(self):
+        return self.variants[None]
+
+    def variant(self, encoding):
+        """body compressed with encoding, or None if that doesn't make it smaller."""
+        compressed = self.variants.get(encoding, False)
+        if compressed is False:
+            # Two threads may both get here; they compute the same bytes
+            body = self.variants[None]
+            try:
+                with open(_build_path(body, encoding), 'rb') as f:
+                    compressed = f.read()
+            except OSError:
+                compressed = compress(body, encoding, static=True)
+            if len(compressed) >= len(body):
+                compressed = None
+            self.variants[encoding] = compressed
+        return compressed
+
+    def select(self, accept_encoding):
+        """Return (encoding or None, body) for an Accept-Encoding header value."""
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return None, self.variants[None]
+        body = self.variant(encoding)
+        if body is None:
+            return None, self.variants[None]
+        return encoding, body
+
+
+def build(build_dir=BUILD_DIR):
+    """Write every variant of every Precompressed body created so far to build_dir.
+
+    Files from earlier builds that no body uses any more are removed. Returns
+    the number of files written.
+    """
+    os.makedirs(build_dir, exist_ok=True)
+    wanted = set()
+    for static in Precompressed.instances:
+        body = static.identity
+        for encoding in SUPPORTED:
+            path = os.path.join(build_dir, os.path.basename(_build_path(body, encoding)))
+            if path in wanted:
+                continue
+            wanted.add(path)
+            with open(path, 'wb') as f:
+                f.write(compress(body, encoding, static=True))
+    for name in os.listdir(build_dir):
+        path = os.path.join(build_dir, name)
+        if path not in wanted:
+            os.remove(path)
+    return len(wanted)
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed responses."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=DYNAMIC_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(DYNAMIC_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Run as a script, this file is __main__; the api modules register their bodies with the package module
+    from bot_verification import compression
+    from bot_verification.server import Router, load_module
+
+    for dest in sorted(set(Router.from_config().targets)):
+        load_module(dest)
+    count = compression.build()
+    print(f'Wrote {count} precompressed files ({", ".join(SUPPORTED)}) to {compression.BUILD_DIR}')
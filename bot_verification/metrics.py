@@ -0,0 +1,228 @@
+"""
+In-process metrics, exposed as Prometheus text at ``/api/metrics``.
+
+Every labelled series is created once at import time (``metric.labels(...)``
+returns a preallocated child), so recording does no lookups and takes no
+locks. Unit increments (``inc()``, histogram bucket counts) are
+``itertools.count`` steps, a single atomic C call. Arbitrary amounts
+(``add()``, histogram sums) are appended to a deque, also atomic, and folded
+into a running total under a lock only every ``FOLD_EVERY`` values or when
+scraped. Histograms have fixed buckets and are made cumulative only when
+rendered.
+
+Values are per process: each serverless instance or server worker counts its
+own requests, so scrape them all or aggregate with ``sum()``. Set
+``METRICS_TOKEN`` to require ``Authorization: Bearer <token>`` on the endpoint.
+"""
+
+import functools
+import itertools
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from hmac import compare_digest
+from time import perf_counter
+
+PREFIX = 'botverify_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; request handling is sub-millisecond when warm, cold starts take far longer
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+FOLD_EVERY = 4096
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+REGISTRY = []
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _count_value(counter):
+    """Current value of an itertools.count without advancing it."""
+    return int(repr(counter)[6:-1])
+
+
+class _Total:
+    """A sum fed from many threads without taking a lock per value."""
+
+    __slots__ = ('_pending', '_append', '_folded', '_lock')
+
+    def __init__(self, lock, start=0):
+        self._pending = deque()
+        self._append = self._pending.append
+        self._folded = start
+        self._lock = lock
+
+    def add(self, amount):
+        self._append(amount)
+        if len(self._pending) > FOLD_EVERY:
+            self.fold()
+
+    def fold(self):
+        """Move pending values into the total. Returns the total."""
+        with self._lock:
+            popleft = self._pending.popleft
+            total = self._folded
+            try:
+                while True:
+                    total += popleft()
+            except IndexError:
+                pass
+            self._folded = total
+            return total
+
+
+class _CounterChild:
+    __slots__ = ('inc', 'add', '_count', '_total')
+
+    def __init__(self, lock):
+        self._count = itertools.count()
+        self._total = _Total(lock)
+        self.inc = self._count.__next__
+        self.add = self._total.add
+
+    @property
+    def value(self):
+        return _count_value(self._count) + self._total.fold()
+
+
+class _HistogramChild:
+    __slots__ = ('_counts', '_bumps', '_sum', '_add', '_bounds')
+
+    def __init__(self, bounds, lock):
+        self._counts = [itertools.count() for _ in range(len(bounds) + 1)]
+        self._bumps = [c.__next__ for c in self._counts]
+        self._sum = _Total(lock, 0.0)
+        self._add = self._sum.add
+        self._bounds = bounds
+
+    @property
+    def counts(self):
+        return [_count_value(c) for c in self._counts]
+
+    @property
+    def sum(self):
+        return self._sum.fold()
+
+    def observe(self, value):
+        self._bumps[bisect_left(self._bounds, value)]()
+        self._add(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """The series for these label values, created on first use (do it at import time)."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    # Unlabelled metrics record directly
+    def inc(self):
+        self.labels().inc()
+
+    def add(self, amount):
+        self.labels().add(amount)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            self._render_child(lines, _label_text(self.labelnames, values), values, child)
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def _render_child(self, lines, labels, values, child):
+        lines.append(f'{self.name}{labels} {_format(child.value)}')
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self._lock)
+
+    def _render_child(self, lines, labels, values, child):
+        # Sum first: concurrent observations may then show up in the counts but not yet the sum
+        total = child.sum
+        counts = child.counts
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            le = _label_text(self.labelnames + ('le',), values + (bound if bound == '+Inf' else repr(bound),))
+            lines.append(f'{self.name}_bucket{le} {cumulative}')
+        lines.append(f'{self.name}_sum{labels} {_format(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+
+
+def authorized(headers):
+    """True if the request may read metrics and debug data (see METRICS_TOKEN)."""
+    return not METRICS_TOKEN or compare_digest(headers.get('authorization') or '', f'Bearer {METRICS_TOKEN}')
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format, as bytes."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.append('')
+    return '\n'.join(lines).encode()
+
+
+REQUEST_SECONDS = Histogram('request_duration_seconds', 'Time spent building responses.', ('route',))
+RESPONSE_BYTES = Counter('response_bytes_total', 'Response body bytes produced, after compression.', ('route',))
+DECODE_SECONDS = Histogram('token_decode_seconds', 'Time spent decoding and verifying tokens.')
+RENDER_SECONDS = Histogram('page_render_seconds', 'Time spent rendering the verification page.')
+VERIFY_OUTCOMES = Counter('verify_outcomes_total', 'Verification page views and submissions by outcome.', ('outcome',))
+CREATE_OUTCOMES = Counter('create_token_outcomes_total', 'Token creation requests by outcome.', ('outcome',))
+ADMISSION_DECISIONS = Counter('admission_decisions_total', 'Requests admitted, rate limited or shed, by route.',
+                              ('route', 'decision'))
+
+
+def instrumented(route):
+    """Decorate a handle_* function to record its duration and response size under route."""
+    duration = REQUEST_SECONDS.labels(route)
+    sent = RESPONSE_BYTES.labels(route)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            start = perf_counter()
+            response = func(*args)
+            duration.observe(perf_counter() - start)
+            sent.add(len(response.body))
+            return response
+        return wrapper
+    return decorator
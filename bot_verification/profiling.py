@@ -0,0 +1,167 @@
+"""
+Sampling profiler for the ``api/`` handlers, off unless ``PROFILE_EVERY`` is set.
+
+``PROFILE_EVERY=N`` runs one request in N under ``cProfile`` (one at a time;
+a request that comes due while another is being profiled is skipped) and
+accumulates the stats in-process, together with wall-clock time per phase:
+
+- ``parse``: request line, headers and body
+- ``decode_token``: token decoding and signature check
+- ``render``: building the verification page
+- ``write``: sending the response, flush included
+
+``PROFILE_TRACEMALLOC=1`` also traces allocations during sampled requests and
+keeps the top allocation sites. The report is written to ``PROFILE_DUMP``
+(a file path) at most every ``PROFILE_DUMP_INTERVAL`` seconds (default 60)
+and served at ``/api/debug/profile``.
+
+Phase times of sampled requests include cProfile's own overhead, so compare
+them with each other rather than with normal latencies. Unsampled requests
+pay one counter step; with profiling off, nothing.
+Sampling happens in :class:`.responses.BaseHandler`, so it covers the
+threaded handlers, not the asyncio app.
+"""
+
+import itertools
+import os
+import threading
+import time
+
+from . import warn
+
+# cProfile, pstats and tracemalloc are imported once profiling is on; pstats
+# alone pulls in dataclasses and inspect, which no cold start should pay for.
+
+PHASES = ('parse', 'decode_token', 'render', 'write')
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+_current = threading.local()
+
+
+class Sample:
+    """Phase timings of one profiled request."""
+
+    __slots__ = ('profile', 'phases')
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+
+class Profiler:
+    """Profiles one in ``every`` requests and aggregates the results."""
+
+    def __init__(self, every, trace_memory=False, dump_path=None, dump_interval=60):
+        self.every = every
+        self.trace_memory = trace_memory
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self._tick = itertools.count(1)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._last_dump = time.monotonic()
+        self.reset()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Profiler configured from PROFILE_* variables, or None if profiling is off."""
+        every = int(environ.get('PROFILE_EVERY') or 0)
+        if every <= 0:
+            return None
+        return cls(
+            every,
+            trace_memory=environ.get('PROFILE_TRACEMALLOC', '') not in ('', '0'),
+            dump_path=environ.get('PROFILE_DUMP') or None,
+            dump_interval=float(environ.get('PROFILE_DUMP_INTERVAL') or 60),
+        )
+
+    def reset(self):
+        with self._lock:
+            self.samples = 0
+            self.stats = None
+            self.phase_totals = dict.fromkeys(PHASES, 0.0)
+            self.phase_counts = dict.fromkeys(PHASES, 0)
+            self.allocations = {}
+
+    def begin(self):
+        """Start profiling this request if it is due. Returns a Sample or None."""
+        if next(self._tick) % self.every or not self._busy.acquire(blocking=False):
+            return None
+        sample = Sample()
+        _current.sample = sample
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+        sample.profile.enable()
+        return sample
+
+    def record(self, phase, seconds):
+        """Add seconds to phase of the request being profiled on this thread, if any."""
+        sample = getattr(_current, 'sample', None)
+        if sample is not None:
+            sample.phases[phase] += seconds
+
+    def finish(self, sample):
+        sample.profile.disable()
+        snapshot = None
+        if self.trace_memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        _current.sample = None
+        self._busy.release()
+
+        with self._lock:
+            self.samples += 1
+            if self.stats is None:
+                import pstats
+                self.stats = pstats.Stats(sample.profile)
+            else:
+                self.stats.add(sample.profile)
+            for phase, seconds in sample.phases.items():
+                if seconds:
+                    self.phase_totals[phase] += seconds
+                    self.phase_counts[phase] += 1
+            if snapshot is not None:
+                for stat in snapshot.statistics('lineno'):
+                    frame = stat.traceback[0]
+                    key = f'{frame.filename}:{frame.lineno}'
+                    size, count = self.allocations.get(key, (0, 0))
+                    self.allocations[key] = (size + stat.size, count + stat.count)
+        if self.dump_path and time.monotonic() - self._last_dump >= self.dump_interval:
+            self._last_dump = time.monotonic()
+            self.dump()
+
+    def report(self):
+        """Human-readable summary of everything profiled so far."""
+        import io
+        out = io.StringIO()
+        with self._lock:
+            out.write(f'Profiled {self.samples} requests (1 in {self.every}, pid {os.getpid()})\n\n')
+            out.write(f'{"phase":<14} {"samples":>8} {"total ms":>10} {"mean ms":>9}\n')
+            for phase in PHASES:
+                count = self.phase_counts[phase]
+                total = self.phase_totals[phase] * 1e3
+                out.write(f'{phase:<14} {count:>8} {total:>10.3f} {total / count if count else 0:>9.4f}\n')
+            out.write('\n')
+            if self.stats is not None:
+                self.stats.stream = out
+                self.stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            if self.allocations:
+                out.write('Top allocation sites (live at the end of sampled requests)\n')
+                top = sorted(self.allocations.items(), key=lambda item: item[1][0], reverse=True)
+                for key, (size, count) in top[:TOP_ALLOCATIONS]:
+                    out.write(f'{size:>10} B {count:>7} blocks  {key}\n')
+        return out.getvalue()
+
+    def dump(self):
+        try:
+            with open(self.dump_path, 'w') as f:
+                f.write(self.report())
+        except OSError as e:
+            warn(__name__, 'Could not write profile to %s: %s', self.dump_path, e)
+
+
+profiler = Profiler.from_env()
@@ -0,0 +1,125 @@
+"""
+Traffic recorder for the verification endpoints, off unless ``RECORD_TRAFFIC`` is set.
+
+``RECORD_TRAFFIC=/path/traffic.ndjson`` appends one JSON line per token
+creation, verification page view and submission::
+
+    {"t": 1792195358.042, "route": "verify_page", "method": "GET", "status": 200,
+     "ms": 0.412, "outcome": "page_shown", "ref": "9f2c41d07a6be318", "age": 37, "enc": "gzip"}
+
+Records are sanitized: no user ids, links, tokens, addresses or headers.
+``ref`` is a keyed hash of the token (keyed with the signing secret, so it is
+stable across workers but can't be reversed), which ties the views and
+submissions of one link together; ``age`` is the token's age in seconds when
+the request arrived and ``enc`` the negotiated Content-Encoding. That is
+enough for ``benchmarks/replay_traffic.py`` to re-issue the stream with
+freshly minted tokens of the same ages.
+
+Each record is written with a single ``O_APPEND`` write, so pre-forked
+workers can share one file. Recording runs in the handler functions, so it
+covers both the threaded and the asyncio server; on Vercel only ``/tmp`` is
+writable and it is per instance, so record on a self-hosted server.
+"""
+
+import functools
+import json
+import os
+import threading
+from time import perf_counter, time
+
+from . import tokens, warn
+
+REF_SIZE = 8
+
+_current = threading.local()
+
+
+class Recorder:
+    """Appends sanitized request records to an NDJSON file."""
+
+    def __init__(self, path, keyring=None):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._signer = (keyring or tokens.default_keyring).signer_for()[1]
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Recorder writing to RECORD_TRAFFIC, or None if recording is off."""
+        path = environ.get('RECORD_TRAFFIC')
+        if not path:
+            return None
+        try:
+            return cls(path)
+        except OSError as e:
+            warn(__name__, 'Not recording traffic, cannot open %s: %s', path, e)
+            return None
+
+    def ref(self, token):
+        return self._signer.digest(b'record:' + token.encode())[:REF_SIZE].hex()
+
+    def write(self, record):
+        try:
+            os.write(self._fd, json.dumps(record, separators=(',', ':')).encode() + b'\n')
+        except OSError as e:
+            warn(__name__, 'Could not record request to %s: %s', self.path, e)
+
+
+recorder = Recorder.from_env()
+
+
+def recorded(route, method):
+    """Decorate a handle_* function to record each request; returns func itself when recording is off."""
+    def decorator(func):
+        if recorder is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            note = _current.note = {}
+            t = time()
+            start = perf_counter()
+            try:
+                response = func(*args)
+            finally:
+                _current.note = None
+            elapsed = perf_counter() - start
+            record = {'t': round(t, 3), 'route': route, 'method': method, 'status': response.status,
+                      'ms': round(elapsed * 1e3, 3)}
+            record.update(note)
+            for name, value in response.headers:
+                if name == 'Content-Encoding':
+                    record['enc'] = value
+            recorder.write(record)
+            return response
+        return wrapper
+    return decorator
+
+
+def note_token(token, timestamp):
+    """Record which token the current request carries and how old it is (timestamp None if invalid)."""
+    note = getattr(_current, 'note', None)
+    if note is not None:
+        note['ref'] = recorder.ref(token)
+        if timestamp is not None:
+            note['age'] = int(time()) - timestamp
+
+
+class _RecordedOutcome:
+    __slots__ = ('_inc', '_name')
+
+    def __init__(self, child, name):
+        self._inc = child.inc
+        self._name = name
+
+    def inc(self):
+        self._inc()
+        note = getattr(_current, 'note', None)
+        if note is not None:
+            note['outcome'] = self._name
+
+
+def outcome(child, name):
+    """child (a counter series) as is, or one that also records name as the outcome when recording."""
+    if recorder is None:
+        return child
+    return _RecordedOutcome(child, name)
@@ -0,0 +1,255 @@
+"""
+One-time-use enforcement for verification tokens.
+
+Used tokens are remembered by a short fingerprint of their MAC (see
+:func:`.tokens.signature`), grouped into buckets by the token's issue time
+(``ts // bucket_seconds``). A token can only be claimed while it is
+unexpired, so once a bucket is older than ``TOKEN_TTL`` nothing in
+it can be presented again and the whole bucket is dropped in one step. Memory
+is bounded by the traffic of a single expiry window.
+
+The backend is picked with ``REPLAY_BACKEND``:
+
+- ``memory`` (default): a set per bucket, private to this process.
+- ``bloom`` or ``bloom:<bits>``: a fixed-size Bloom filter per bucket; constant
+  memory with a small, size-dependent chance of rejecting a fresh token.
+- ``sqlite:///path/to/file.db``: shared by every process on the same host.
+- ``redis://host:port/db``: any Redis-protocol server, shared across hosts.
+- ``off``: disable the check.
+
+Serverless instances do not share memory, so deployments running more than
+one instance need the redis backend for a hard one-time guarantee. The
+self-hosted server gives a pool of several workers a shared SQLite file when
+``REPLAY_BACKEND`` is unset.
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from . import warn
+from .tokens import TOKEN_TTL
+
+BUCKET_SECONDS = 60
+
+
+def fingerprint(mac):
+    """8-byte digest identifying a token, by its MAC, in the replay filter.
+
+    The token string itself won't do: different spellings of a token could
+    decode to the same signed bytes.
+    """
+    return hashlib.blake2b(mac, digest_size=8).digest()
+
+
+class MemoryBackend:
+    """A set of fingerprints per bucket."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, bucket, fp, expires_at):
+        with self._lock:
+            seen = self._buckets.get(bucket)
+            if seen is None:
+                seen = self._buckets[bucket] = set()
+            elif fp in seen:
+                return False
+            seen.add(fp)
+            return True
+
+    def drop_before(self, bucket):
+        with self._lock:
+            for old in [b for b in self._buckets if b < bucket]:
+                del self._buckets[old]
+
+
+class BloomBackend(MemoryBackend):
+    """A fixed-size Bloom filter per bucket.
+
+    Fingerprints are already uniformly distributed digests, so the bit
+    positions come from double hashing the two halves of the fingerprint.
+    """
+
+    def __init__(self, bits=1 << 20, hashes=4):
+        super().__init__()
+        self.bits = bits
+        self.hashes = hashes
+
+    def add(self, bucket, fp, expires_at):
+        h1 = int.from_bytes(fp[:4], 'big')
+        h2 = int.from_bytes(fp[4:], 'big') | 1
+        positions = [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+        with self._lock:
+            bitset = self._buckets.get(bucket)
+            if bitset is None:
+                bitset = self._buckets[bucket] = bytearray(self.bits // 8 + 1)
+            new = False
+            for pos in positions:
+                byte, mask = pos >> 3, 1 << (pos & 7)
+                if not bitset[byte] & mask:
+                    bitset[byte] |= mask
+                    new = True
+            return new
+
+
+class SQLiteBackend:
+    """Fingerprints in a local SQLite file, shared by processes on one host.
+
+    ``errors`` holds the exception types the guard treats as the store being unavailable.
+    """
+
+    def __init__(self, path):
+        import sqlite3
+        self.errors = (sqlite3.Error,)
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS used_tokens '
+            '(bucket INTEGER NOT NULL, fp BLOB NOT NULL, PRIMARY KEY (bucket, fp)) WITHOUT ROWID'
+        )
+        self._lock = threading.Lock()
+
+    def add(self, bucket, fp, expires_at):
+        with self._lock:
+            cur = self._conn.execute('INSERT OR IGNORE INTO used_tokens (bucket, fp) VALUES (?, ?)', (bucket, fp))
+            return cur.rowcount == 1
+
+    def drop_before(self, bucket):
+        with self._lock:
+            self._conn.execute('DELETE FROM used_tokens WHERE bucket < ?', (bucket,))
+
+
+class RedisBackend:
+    """One Redis set per bucket, speaking just enough RESP for SADD/EXPIREAT.
+
+    Buckets expire on the server, so drop_before is a no-op here.
+    """
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, prefix='replay', timeout=2.0):
+        self.address = (host, port)
+        self.db = db
+        self.password = password
+        self.prefix = prefix.encode()
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url):
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        return cls(parsed.hostname or '127.0.0.1', parsed.port or 6379, db, parsed.password)
+
+    def _connect(self):
+        self._sock = socket.create_connection(self.address, self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self._call(b'AUTH', self.password.encode())
+        if self.db:
+            self._call(b'SELECT', str(self.db).encode())
+
+    def _send(self, *commands):
+        out = []
+        for args in commands:
+            out.append(b'*%d\r\n' % len(args))
+            for arg in args:
+                out.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._sock.sendall(b''.join(out))
+        return [self._read_reply() for _ in commands]
+
+    def _call(self, *args):
+        return self._send(args)[0]
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'-':
+            raise ConnectionError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            return None if size < 0 else self._file.read(size + 2)[:-2]
+        return rest
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._file = None
+
+    def add(self, bucket, fp, expires_at):
+        key = b'%s:%d' % (self.prefix, bucket)
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    added, _ = self._send((b'SADD', key, fp), (b'EXPIREAT', key, str(expires_at).encode()))
+                    return added == 1
+                except OSError:
+                    self._close()
+                    if attempt:
+                        raise
+
+    def drop_before(self, bucket):
+        pass
+
+
+class ReplayGuard:
+    """Claims tokens at most once while they are valid."""
+
+    def __init__(self, backend, ttl=TOKEN_TTL, bucket_seconds=BUCKET_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.bucket_seconds = bucket_seconds
+        self._oldest_bucket = 0
+        self._errors = (OSError,) + getattr(backend, 'errors', ())
+
+    def claim(self, mac, timestamp, now=None):
+        """Record the token with MAC mac (issued at timestamp) as used. Returns False if it was already used.
+
+        Backend errors fail open: the token is accepted and the error logged,
+        so an unreachable shared store cannot take verification down with it.
+        """
+        now = int(time.time()) if now is None else now
+        oldest = (now - self.ttl) // self.bucket_seconds
+        bucket = timestamp // self.bucket_seconds
+        try:
+            if oldest > self._oldest_bucket:
+                self._oldest_bucket = oldest
+                self.backend.drop_before(oldest)
+            return self.backend.add(bucket, fingerprint(mac), (bucket + 1) * self.bucket_seconds + self.ttl)
+        except self._errors as e:
+            warn(__name__, 'Replay backend unavailable, accepting token: %s', e)
+            return True
+
+
+def backend_from_env(spec=None):
+    """Build the backend named by REPLAY_BACKEND (see module docstring), or None if disabled."""
+    spec = spec if spec is not None else os.getenv('REPLAY_BACKEND', 'memory')
+    if spec == 'off':
+        return None
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec == 'bloom' or spec.startswith('bloom:'):
+        _, _, bits = spec.partition(':')
+        return BloomBackend(int(bits)) if bits else BloomBackend()
+    if spec.startswith('sqlite://'):
+        return SQLiteBackend(spec[len('sqlite://'):] or ':memory:')
+    if spec.startswith('redis://'):
+        return RedisBackend.from_url(spec)
+    raise ValueError(f'Unknown REPLAY_BACKEND: {spec}')
+
+
+_backend = backend_from_env()
+replay_guard = ReplayGuard(_backend) if _backend is not None else None
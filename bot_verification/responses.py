@@ -0,0 +1,265 @@
+"""
+Responses shared by the handlers in ``api/``.
+
+Request logic in ``api/`` builds a :class:`Response`; the
+``BaseHTTPRequestHandler`` classes send it with :meth:`BaseHandler.send` and
+the asyncio app in :mod:`.asgi` sends the very same object. The builders take
+care of Content-Encoding negotiation (see :mod:`.compression`),
+``Vary: Accept-Encoding`` and ``Content-Length`` framing (which keeps HTTP/1.1
+connections reusable), so every endpoint sends bodies the same way.
+"""
+
+import json
+import socket
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler
+from time import monotonic, perf_counter
+
+from .compression import compress_dynamic
+from .profiling import profiler
+
+# Browsers cap this (Chromium at 2 hours), but a day is what we're happy with
+PREFLIGHT_MAX_AGE = '86400'
+
+Response = namedtuple('Response', 'status headers body')
+Response.__doc__ = """A complete response: status code, list of (name, value) headers and body bytes."""
+
+_connection = threading.local()
+
+
+def _body_rejection(status, message):
+    body = json.dumps({'success': False, 'message': message}).encode()
+    return Response(status, [
+        ('Content-type', 'application/json'),
+        ('Access-Control-Allow-Origin', '*'),
+        ('Content-Length', str(len(body))),
+    ], body)
+
+
+BODY_TOO_LARGE = _body_rejection(413, 'Request body too large')
+BODY_TIMED_OUT = _body_rejection(408, 'Request body not received in time')
+LENGTH_REQUIRED = _body_rejection(411, 'Content-Length required')
+BAD_LENGTH = _body_rejection(400, 'Invalid Content-Length')
+
+# Most that BaseHandler.read_body_lines reads from the socket at once
+LINE_READ_SIZE = 65536
+
+
+def peer_address():
+    """(host, port) of the client on the connection this thread is serving, or None."""
+    return getattr(_connection, 'peer', None)
+
+
+def set_peer_address(address):
+    """Record the client address of the connection this thread is serving (for servers not using BaseHandler)."""
+    _connection.peer = address
+
+
+class BaseHandler(BaseHTTPRequestHandler):
+    """Base for the api/ handlers: persistent HTTP/1.1 connections.
+
+    Writes are buffered until the end of each request (or an explicit flush)
+    and Nagle is off, so headers and body leave in one segment instead of
+    stalling on delayed ACKs once the connection is reused. Idle connections
+    are closed after ``timeout`` seconds so they can't pin a worker thread.
+
+    Requests picked by the sampling profiler (see :mod:`.profiling`) are
+    profiled from parse_request until their response has been flushed.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    timeout = 15
+    _sample = None
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        _connection.peer = self.client_address
+
+    def handle_one_request(self):
+        try:
+            BaseHTTPRequestHandler.handle_one_request(self)
+        finally:
+            sample = self._sample
+            if sample is not None:
+                self._sample = None
+                profiler.finish(sample)
+
+    def parse_request(self):
+        if profiler is None:
+            return BaseHTTPRequestHandler.parse_request(self)
+        sample = self._sample = profiler.begin()
+        if sample is None:
+            return BaseHTTPRequestHandler.parse_request(self)
+        start = perf_counter()
+        parsed = BaseHTTPRequestHandler.parse_request(self)
+        sample.phases['parse'] += perf_counter() - start
+        return parsed
+
+    def read_body(self, limit, timeout):
+        """Read a body of at most limit bytes that arrives within timeout seconds.
+
+        Returns None when the body was refused; the rejection has then been
+        sent and the connection marked for closing, since an unread body
+        can't be skipped to get to the next request.
+        """
+        start = perf_counter() if self._sample is not None else None
+        body = self._read_body(limit, timeout)
+        if start is not None:
+            self._sample.phases['parse'] += perf_counter() - start
+        return body
+
+    def read_body_lines(self, limit, timeout):
+        """Like read_body, but return an iterator over the body's lines, read as they are consumed.
+
+        Returns None when the body was refused. The response may start before
+        the whole body is in, so a body that stops arriving in time just ends
+        the iteration early; body_complete then says whether it was all read.
+        """
+        length = self._body_length(limit)
+        if length is None:
+            return None
+        self.body_complete = not length
+        return self._body_lines(length, monotonic() + timeout)
+
+    def _body_length(self, limit):
+        headers = self.headers
+        length = headers.get('Content-Length')
+        if 'Transfer-Encoding' in headers:
+            return self._refuse_body(LENGTH_REQUIRED)
+        if not length:
+            return 0
+        if not (length.isascii() and length.isdigit()):
+            return self._refuse_body(BAD_LENGTH)
+        length = int(length)
+        if length > limit:
+            return self._refuse_body(BODY_TOO_LARGE)
+        return length
+
+    def _body_lines(self, remaining, deadline):
+        rfile = self.rfile
+        sock = self.connection
+        pending = []
+        try:
+            while remaining:
+                sock.settimeout(max(deadline - monotonic(), 0.001))
+                chunk = rfile.read1(min(remaining, LINE_READ_SIZE))
+                # The consumer writes between lines; those writes get the usual timeout
+                sock.settimeout(self.timeout)
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                start = 0
+                end = chunk.find(b'\n')
+                while end >= 0:
+                    pending.append(chunk[start:end + 1])
+                    yield b''.join(pending)
+                    pending = []
+                    start = end + 1
+                    end = chunk.find(b'\n', start)
+                if start < len(chunk):
+                    pending.append(chunk[start:])
+        except socket.timeout:
+            pass
+        finally:
+            sock.settimeout(self.timeout)
+            if remaining:
+                # Cut short or abandoned: the rest can't be skipped to get to the next request
+                self.close_connection = True
+        if not remaining:
+            self.body_complete = True
+            if pending:
+                yield b''.join(pending)
+
+    def _read_body(self, limit, timeout):
+        length = self._body_length(limit)
+        if not length:
+            return None if length is None else b''
+        rfile = self.rfile
+        sock = self.connection
+        deadline = monotonic() + timeout
+        chunks = []
+        try:
+            while length:
+                sock.settimeout(max(deadline - monotonic(), 0.001))
+                chunk = rfile.read1(length)
+                if not chunk:
+                    # The client went away mid-body
+                    self.close_connection = True
+                    return None
+                chunks.append(chunk)
+                length -= len(chunk)
+        except socket.timeout:
+            chunks = None
+        finally:
+            sock.settimeout(self.timeout)
+        if chunks is None:
+            return self._refuse_body(BODY_TIMED_OUT)
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def _refuse_body(self, response):
+        # Connection: close also makes the base class stop reading requests from this connection
+        self.send(response._replace(headers=response.headers + [('Connection', 'close')]))
+        return None
+
+    def send(self, response):
+        """Write a Response (headers only for HEAD requests)."""
+        start = perf_counter() if self._sample is not None else None
+        self.send_response(response.status)
+        for name, value in response.headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(response.body)
+        if start is not None:
+            self.wfile.flush()
+            self._sample.phases['write'] += perf_counter() - start
+
+
+def _response(status, content_type, encoding, body, headers):
+    out = [('Content-type', content_type), ('Vary', 'Accept-Encoding')]
+    if encoding is not None:
+        out.append(('Content-Encoding', encoding))
+    out.extend(headers)
+    out.append(('Content-Length', str(len(body))))
+    return Response(status, out, body)
+
+
+def bytes_response(body, content_type, accept_encoding, status=200, headers=()):
+    """A per-request body, compressed on the fly when large enough."""
+    encoding, body = compress_dynamic(body, accept_encoding)
+    return _response(status, content_type, encoding, body, headers)
+
+
+def precompressed_response(static_body, content_type, accept_encoding, status=200, headers=()):
+    """A Precompressed body in the best encoding the client accepts."""
+    encoding, body = static_body.select(accept_encoding)
+    return _response(status, content_type, encoding, body, headers)
+
+
+def preflight_response(methods):
+    """A CORS preflight answer, cacheable by the browser for PREFLIGHT_MAX_AGE seconds."""
+    return Response(204, [
+        ('Access-Control-Allow-Origin', '*'),
+        ('Access-Control-Allow-Methods', methods),
+        ('Access-Control-Allow-Headers', 'Content-Type'),
+        ('Access-Control-Max-Age', PREFLIGHT_MAX_AGE),
+        ('Content-Length', '0'),
+    ], b'')
+
+
+def send_bytes(handler, body, content_type, status=200, headers=()):
+    """Send a per-request body, compressing it on the fly when large enough."""
+    handler.send(bytes_response(body, content_type, handler.headers.get('Accept-Encoding'), status, headers))
+
+
+def send_precompressed(handler, static_body, content_type, status=200, headers=()):
+    """Send a Precompressed body in the best encoding the client accepts."""
+    handler.send(precompressed_response(static_body, content_type, handler.headers.get('Accept-Encoding'), status, headers))
+
+
+def send_preflight(handler, methods):
+    """Answer a CORS preflight."""
+    handler.send(preflight_response(methods))
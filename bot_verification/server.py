@@ -0,0 +1,315 @@
+"""
+Self-hosted server for the handlers in ``api/``.
+
+Runs the same ``handler`` classes Vercel runs, routed by the ``routes`` in
+``vercel.json``, as a pre-forked pool of worker processes::
+
+    python -m bot_verification.server --port 8000 --workers 4
+
+Each worker runs a threaded HTTP server. Where ``SO_REUSEPORT`` is available
+the master binds one listening socket per worker slot and the kernel spreads
+connections across them; elsewhere it binds once and every worker shares that
+socket. Workers inherit their socket, and the master keeps it open across
+worker generations.
+
+Signals (sent to the master):
+
+- ``SIGHUP``: graceful reload. A fresh set of workers is started (re-importing
+  the handler code) on the same sockets, then the old ones stop accepting and
+  exit once their in-flight requests are done. Connections still queued on a
+  socket are accepted by its new worker rather than reset.
+- ``SIGTERM``/``SIGINT``: graceful shutdown.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import signal
+import socket
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from . import warn
+from .responses import BaseHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG = os.path.join(ROOT, 'vercel.json')
+
+
+class Router:
+    """vercel.json routes compiled into one regex alternation.
+
+    Every route becomes a named group, in file order, so a single fullmatch
+    both finds the first matching route and tells which one it was.
+    """
+
+    def __init__(self, routes):
+        self.targets = [dest for _, dest in routes]
+        self._pattern = re.compile('|'.join(f'(?P<r{i}>{src})' for i, (src, _) in enumerate(routes)))
+
+    @classmethod
+    def from_config(cls, path=DEFAULT_CONFIG):
+        with open(path) as f:
+            config = json.load(f)
+        return cls([(route['src'], route['dest']) for route in config.get('routes', [])])
+
+    def match(self, path):
+        """Index of the first route matching path (without query string), or None."""
+        m = self._pattern.fullmatch(path)
+        if m is None:
+            return None
+        return int(m.lastgroup[1:])
+
+
+class _RoutingMixin:
+    """Re-dispatches every request to the handler class of the matching route.
+
+    ``BaseHTTPRequestHandler`` handles requests in its constructor, so the
+    instance switches its own class to the routed handler (combined with this
+    mixin, so the next request on a keep-alive connection is routed again).
+    """
+
+    router = None
+    routed_classes = ()
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        index = self.router.match(self.path.split('?', 1)[0])
+        if index is None:
+            self.send_error(404)
+            return False
+        self.__class__ = self.routed_classes[index]
+        return True
+
+
+def load_module(dest, root=ROOT):
+    """Import the api module of a route destination such as /api/verify.py."""
+    path = os.path.join(root, dest.lstrip('/'))
+    name = 'api_' + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_handler(dest, root=ROOT):
+    """Import the handler class from a route destination such as /api/verify.py."""
+    return load_module(dest, root).handler
+
+
+def build_handler_class(router, root=ROOT):
+    """Create the request handler class that dispatches through router."""
+    handlers = {}
+    for dest in router.targets:
+        if dest not in handlers:
+            handlers[dest] = load_handler(dest, root)
+    dispatcher = type('Dispatcher', (_RoutingMixin, BaseHandler), {'router': router})
+    dispatcher.routed_classes = tuple(
+        type(handlers[dest].__name__, (_RoutingMixin, handlers[dest]), {'router': router})
+        for dest in router.targets
+    )
+    for cls in dispatcher.routed_classes:
+        cls.routed_classes = dispatcher.routed_classes
+    return dispatcher
+
+
+def bind_socket(host, port, backlog, reuse_port):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class WorkerServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer on an already bound and listening socket."""
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, sock, handler_class):
+        ThreadingHTTPServer.__init__(self, sock.getsockname()[:2], handler_class, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_address = sock.getsockname()
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+
+
+def _exit_with_master(master_pid, server):
+    """Shut the worker down if the master dies without stopping it (e.g. SIGKILL)."""
+    while os.getppid() == master_pid:
+        time.sleep(1)
+    server.shutdown()
+
+
+def run_worker(args, sock, forked=True):
+    """Worker process body: load the handlers, serve until SIGTERM."""
+    server = WorkerServer(sock, build_handler_class(Router.from_config(args.config), os.path.dirname(args.config)))
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it can't run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    if forked:
+        # Ctrl-C and reloads are the master's business
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        threading.Thread(target=_exit_with_master, args=(os.getppid(), server), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+class Master:
+    """Forks and supervises the worker pool."""
+
+    def __init__(self, args):
+        self.args = args
+        self.reuse_port = hasattr(socket, 'SO_REUSEPORT') and not args.no_reuse_port
+        if self.reuse_port:
+            self.sockets = [bind_socket(args.host, args.port, args.backlog, True) for _ in range(args.workers)]
+        else:
+            self.sockets = [bind_socket(args.host, args.port, args.backlog, False)] * args.workers
+        self.workers = {}  # pid -> slot, the index of its socket
+        self.retiring = set()
+        self.running = True
+        self.reload_requested = False
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                sock = self.sockets[slot]
+                for other in set(self.sockets) - {sock}:
+                    other.close()
+                run_worker(self.args, sock)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = slot
+        return pid
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        """Collect exited workers. Returns the slots of current workers that died unexpectedly."""
+        died = []
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                died.append(self.workers.pop(pid))
+            self.retiring.discard(pid)
+        return died
+
+    def reload(self):
+        old = set(self.workers)
+        self.workers.clear()
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        # Give the new generation a moment to load the handlers before the old one stops accepting
+        time.sleep(0.5)
+        self.retiring |= old
+        self.stop_workers(old)
+
+    def run(self):
+        def on_stop(signum, frame):
+            self.running = False
+
+        def on_reload(signum, frame):
+            self.reload_requested = True
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_reload)
+
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+        mode = 'SO_REUSEPORT' if self.reuse_port else 'shared socket'
+        print(f'Serving on http://{self.args.host}:{self.args.port} '
+              f'({self.args.workers} workers, {mode}, master pid {os.getpid()})', flush=True)
+
+        while self.running:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            for slot in self.reap():
+                if self.running:
+                    # Don't spin if workers die on startup (e.g. a broken handler import)
+                    time.sleep(1)
+                    self.spawn(slot)
+            time.sleep(0.2)
+
+        self.stop_workers(set(self.workers) | self.retiring)
+        while self.workers or self.retiring:
+            self.reap()
+            time.sleep(0.05)
+
+
+def share_replay_backend(args):
+    """Give a multi-worker pool one replay store, as each worker would otherwise keep its own.
+
+    With REPLAY_BACKEND unset, the workers share a SQLite file in the temp
+    directory; a per-process backend set explicitly only gets a warning.
+    """
+    if args.workers <= 1:
+        return
+    spec = os.environ.get('REPLAY_BACKEND', '')
+    if not spec:
+        path = os.path.join(tempfile.gettempdir(), f'bot-verification-replay-{args.port}.db')
+        os.environ['REPLAY_BACKEND'] = 'sqlite://' + path
+    elif spec == 'memory' or spec.split(':')[0] == 'bloom':
+        warn(__name__, 'REPLAY_BACKEND=%s is per process: with %d workers a token can be used once per worker',
+             spec, args.workers)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the api/ handlers with vercel.json routing.')
+    parser.add_argument('--host', default=os.getenv('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--backlog', type=int, default=1024, help='listen backlog per socket')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='path to vercel.json')
+    parser.add_argument('--no-reuse-port', action='store_true', help='share one socket instead of SO_REUSEPORT')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.config = os.path.abspath(args.config)
+    if not hasattr(os, 'fork'):
+        # No pre-forking on this platform: serve from this process
+        run_worker(args, bind_socket(args.host, args.port, args.backlog, False), forked=False)
+        return
+    # Before forking, so every worker builds the same backend
+    share_replay_backend(args)
+    Master(args).run()
+
+
+if __name__ == '__main__':
+    main()
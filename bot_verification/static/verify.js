@@ -0,0 +1,141 @@
+const USER_ID = new URLSearchParams(window.location.search).get('uid') || 'anonymous';
+const TIME_LEFT = ISSUED_AT + TOKEN_TTL - Math.floor(Date.now() / 1000);
+const VERIFICATION_TIME = 10;
+let timeLeft = VERIFICATION_TIME;
+let powNonce = null;
+let interactionTime = 0;
+let expired = false;
+
+// Proof of work: find a nonce so that SHA-256(POW_CHALLENGE + ':' + nonce) starts with
+// `difficulty` zero bits. The server checks it with a single hash.
+const SHA256_K = new Uint32Array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+]);
+const SHA256_H = [0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19];
+const sha256Words = new Uint32Array(64);
+
+// First 32 bits of SHA-256 of an ASCII string short enough for one block (< 56 characters)
+function sha256FirstWord(message) {
+    const w = sha256Words;
+    w.fill(0);
+    for (let i = 0; i < message.length; i++) w[i >> 2] |= message.charCodeAt(i) << (24 - (i & 3) * 8);
+    w[message.length >> 2] |= 0x80 << (24 - (message.length & 3) * 8);
+    w[15] = message.length * 8;
+    for (let i = 16; i < 64; i++) {
+        const x = w[i - 15], y = w[i - 2];
+        const s0 = ((x >>> 7) | (x << 25)) ^ ((x >>> 18) | (x << 14)) ^ (x >>> 3);
+        const s1 = ((y >>> 17) | (y << 15)) ^ ((y >>> 19) | (y << 13)) ^ (y >>> 10);
+        w[i] = w[i - 16] + s0 + w[i - 7] + s1;
+    }
+    let [a, b, c, d, e, f, g, h] = SHA256_H;
+    for (let i = 0; i < 64; i++) {
+        const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+        const t1 = (h + S1 + ((e & f) ^ (~e & g)) + SHA256_K[i] + w[i]) | 0;
+        const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+        const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+        h = g; g = f; f = e; e = (d + t1) | 0; d = c; c = b; b = a; a = (t1 + t2) | 0;
+    }
+    return (SHA256_H[0] + a) >>> 0;
+}
+
+function solveChallenge(challenge, done) {
+    const difficulty = parseInt(challenge, 10);
+    const prefix = challenge + ':';
+    let nonce = 0;
+    // Work in slices so the countdown keeps ticking while we search
+    (function slice() {
+        for (const end = nonce + 20000; nonce < end; nonce++) {
+            if (difficulty === 0 || sha256FirstWord(prefix + nonce) >>> (32 - difficulty) === 0) {
+                return done(String(nonce));
+            }
+        }
+        setTimeout(slice, 0);
+    })();
+}
+
+document.getElementById('question').textContent = '🔄 Checking your browser...';
+solveChallenge(POW_CHALLENGE, nonce => {
+    powNonce = nonce;
+    document.getElementById('question').textContent = '✅ Browser check complete';
+    checkVerifyButton();
+});
+
+setInterval(() => {
+    timeLeft--;
+    interactionTime++;
+    document.getElementById('timer').textContent = timeLeft > 0 ? timeLeft + 's' : '✓ Ready';
+    document.getElementById('progress').style.width = ((VERIFICATION_TIME - timeLeft) / VERIFICATION_TIME * 100) + '%';
+    if (timeLeft <= 0) checkVerifyButton();
+}, 1000);
+
+function checkVerifyButton() {
+    const btn = document.getElementById('verifyBtn');
+    if (!expired && interactionTime >= VERIFICATION_TIME && powNonce !== null) {
+        btn.classList.add('active');
+        btn.disabled = false;
+    }
+}
+
+document.getElementById('verifyBtn').onclick = async () => {
+    document.getElementById('loading').classList.add('active');
+    document.getElementById('verifyBtn').disabled = true;
+
+    try {
+        const response = await fetch('/' + path_prefix + '/' + TOKEN + '/submit', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                user_id: USER_ID,
+                interaction_time: interactionTime,
+                pow_challenge: POW_CHALLENGE,
+                pow_nonce: powNonce
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            document.getElementById('loading').innerHTML = '<div style="color: #4caf50; font-size: 24px; margin-bottom: 10px;">✓</div><p style="color: #4caf50; font-weight: 600;">Verification Successful!</p><p style="color: #666; font-size: 14px;">Redirecting to download link...</p>';
+            setTimeout(() => window.location.href = data.redirect_url, 1000);
+        } else {
+            showError(data.message || 'Verification failed');
+            document.getElementById('loading').classList.remove('active');
+            document.getElementById('verifyBtn').disabled = false;
+        }
+    } catch (error) {
+        showError('❌ Network error. Please try again.');
+        document.getElementById('loading').classList.remove('active');
+        document.getElementById('verifyBtn').disabled = false;
+    }
+};
+
+function showError(message) {
+    const errorDiv = document.getElementById('error');
+    errorDiv.textContent = message;
+    errorDiv.classList.add('active');
+    setTimeout(() => errorDiv.classList.remove('active'), 5000);
+}
+
+setTimeout(() => {
+    expired = true;
+    const btn = document.getElementById('verifyBtn');
+    btn.classList.remove('active');
+    btn.disabled = true;
+    const errorDiv = document.getElementById('error');
+    errorDiv.textContent = '⌛ This verification link has expired. Please request a new one from the bot.';
+    errorDiv.classList.add('active');
+}, Math.max(TIME_LEFT, 0) * 1000);
+
+document.addEventListener('contextmenu', e => e.preventDefault());
+document.addEventListener('keydown', e => {
+    if (e.key === 'F12' || (e.ctrlKey && e.shiftKey && e.key === 'I')) {
+        e.preventDefault();
+    }
+});
@@ -0,0 +1,63 @@
+"""
+Import-time compiled HTML templates.
+
+A template is plain text with ``{{name}}`` placeholders. :func:`compile_template`
+splits it once into pre-encoded byte segments, so rendering a response is just
+interleaving those segments with the already-escaped values, with no string
+formatting or ``.encode()`` of the static parts per request.
+"""
+
+import html
+import json
+import re
+
+_PLACEHOLDER = re.compile(r'\{\{(\w+)\}\}')
+# json.dumps already escapes non-ASCII (including U+2028/U+2029); these three
+# are what could still close the <script> element or start an HTML comment.
+_JS_UNSAFE = {'<': '\\u003c', '>': '\\u003e', '&': '\\u0026'}
+_JS_UNSAFE_RE = re.compile('[<>&]')
+_JS_PLAIN = re.compile(r'[\w\-.~ ]*', re.ASCII).fullmatch
+
+
+class Template:
+    """A template split into static byte segments and the placeholder names between them."""
+
+    __slots__ = ('segments', 'names')
+
+    def __init__(self, segments, names):
+        self.segments = segments
+        self.names = names
+
+    def render(self, values):
+        """Return the list of byte chunks for values (a dict of name -> bytes)."""
+        segments = self.segments
+        out = [segments[0]]
+        for i, name in enumerate(self.names, 1):
+            out.append(values[name])
+            out.append(segments[i])
+        return out
+
+
+def compile_template(text, **static):
+    """Compile text with {{name}} placeholders into a Template.
+
+    Placeholders named in static (e.g. asset URLs) are filled in once here
+    rather than at render time.
+    """
+    if static:
+        text = _PLACEHOLDER.sub(lambda m: static.get(m.group(1), m.group()), text)
+    parts = _PLACEHOLDER.split(text)
+    return Template([p.encode() for p in parts[0::2]], parts[1::2])
+
+
+def html_value(value):
+    """Escape value for HTML text or attribute content. Returns bytes."""
+    return html.escape(str(value)).encode()
+
+
+def js_value(value):
+    """Encode value as a JavaScript literal safe to embed in a <script> block. Returns bytes."""
+    if isinstance(value, str) and _JS_PLAIN(value):
+        # Tokens, numeric uids and path prefixes never need escaping
+        return b'"%s"' % value.encode()
+    return _JS_UNSAFE_RE.sub(lambda m: _JS_UNSAFE[m.group()], json.dumps(value)).encode()
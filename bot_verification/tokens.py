@@ -0,0 +1,399 @@
+"""
+Token codec shared by ``api/create_token.py``, ``api/verify.py`` and the bot helper.
+
+v4 token layout (base64url, unpadded)::
+
+    version:u8 | kid:u8 | uid:varint | ts:u32be | link_tag:varint | link | mac[:MAC_SIZE]
+
+``kid`` names the keyring entry that signed the token, so verification picks
+the key directly instead of trying every configured key. v3 tokens store the
+link as ``link_len:varint | link`` instead; v2 tokens have the v3 layout
+without ``kid`` and are verified with key 0.
+
+The v4 link is compacted with that version's :class:`LinkDictionary`:
+``link_tag`` is ``prefix << 1 | deflated``, where ``prefix`` indexes a frozen
+table of common shortener prefixes (0 for none) that is stripped from the
+link, and the rest runs up to the MAC, raw or, when that is shorter, deflated
+with the dictionary's preset. Decoding restores the exact original link.
+
+uid is tagged in its lowest bit: numeric ids are stored as ``varint(uid << 1)``,
+anything else as ``varint(len << 1 | 1)`` followed by the UTF-8 bytes.
+
+Legacy ``payload~hexsig`` tokens (base64 JSON + full hex HMAC) are still
+accepted by :func:`decode`, also with key 0, so links minted before v2 keep
+working.
+
+Keys come from ``SECRET_KEYS``, a JSON object::
+
+    {"active": 2, "keys": {"1": "old-secret", "2": "new-secret"},
+     "bots": {"filebot": 3}, "verify_until": {"1": 1793000000}}
+
+``active`` is the default signing key id, ``bots`` maps bot names to their own
+signing key id, and every other key is verify-only. ``verify_until`` optionally
+retires a verify-only key at a unix timestamp once its grace window is over.
+Without ``SECRET_KEYS`` the keyring holds ``SECRET_KEY`` alone as key 0; with
+it, an explicitly set ``SECRET_KEY`` is still kept as key 0 (if not otherwise
+defined) so tokens minted before the rotation keep verifying.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from hmac import compare_digest as _compare
+
+SECRET_KEY = os.getenv('SECRET_KEY', 'nexora-verify-secret-2024')
+
+TOKEN_VERSION = 4
+MAC_SIZE = 16
+TOKEN_TTL = 300
+MAX_KEY_ID = 0xff
+
+_NONE = (None, None, None)
+_pack_ts = struct.Struct('>I').pack
+_unpack_ts = struct.Struct('>I').unpack_from
+_b64encode = base64.urlsafe_b64encode
+_b64decode = base64.urlsafe_b64decode
+_a2b_base64 = binascii.a2b_base64
+_FROM_URLSAFE = bytes.maketrans(b'-_', b'+/')
+_PADDING = ('', '===', '==', '=')
+
+
+class Signer:
+    """HMAC-SHA256 with the keyed inner/outer hash states precomputed.
+
+    ``hmac.new(key, ...)`` re-derives the padded key and hashes both pads on
+    every call; here that happens once per key and each MAC only clones the
+    two ready-made states.
+    """
+
+    __slots__ = ('_inner', '_outer')
+
+    def __init__(self, key):
+        if isinstance(key, str):
+            key = key.encode()
+        block_size = hashlib.sha256().block_size
+        if len(key) > block_size:
+            key = hashlib.sha256(key).digest()
+        key = key.ljust(block_size, b'\0')
+        self._inner = hashlib.sha256(bytes(b ^ 0x36 for b in key))
+        self._outer = hashlib.sha256(bytes(b ^ 0x5c for b in key))
+
+    def digest(self, data):
+        """Full 32-byte HMAC-SHA256 of data."""
+        inner = self._inner.copy()
+        inner.update(data)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+    def mac(self, data):
+        """Truncated MAC as embedded in binary tokens."""
+        return self.digest(data)[:MAC_SIZE]
+
+
+class Keyring:
+    """Signing and verification keys indexed by their one-byte key id.
+
+    keys maps key id -> secret. active is the default signing key id, bots maps
+    a bot name to its signing key id and verify_until maps a key id to the unix
+    time after which it stops verifying.
+    """
+
+    def __init__(self, keys, active=0, bots=None, verify_until=None):
+        bots = bots or {}
+        verify_until = verify_until or {}
+        self._table = [None] * (MAX_KEY_ID + 1)
+        for kid, secret in keys.items():
+            kid = int(kid)
+            if not 0 <= kid <= MAX_KEY_ID:
+                raise ValueError(f'Key id {kid} out of range 0-{MAX_KEY_ID}')
+            self._table[kid] = (Signer(secret), verify_until.get(kid, verify_until.get(str(kid))))
+        self._signing = {}
+        for bot, kid in [(None, active)] + list(bots.items()):
+            kid = int(kid)
+            if not 0 <= kid <= MAX_KEY_ID or self._table[kid] is None:
+                raise ValueError(f'Signing key id {kid} is not in the keyring')
+            self._signing[bot] = (kid, self._table[kid][0])
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Build the keyring from SECRET_KEYS/SECRET_KEY as described in the module docstring."""
+        spec = environ.get('SECRET_KEYS')
+        if not spec:
+            return cls({0: environ.get('SECRET_KEY', SECRET_KEY)})
+        config = json.loads(spec)
+        keys = {int(kid): secret for kid, secret in config['keys'].items()}
+        if 'SECRET_KEY' in environ:
+            keys.setdefault(0, environ['SECRET_KEY'])
+        return cls(keys, config.get('active', 0), config.get('bots'), config.get('verify_until'))
+
+    def signer_for(self, bot=None):
+        """Return (kid, signer) for bot's signing key, or the active key. Raises KeyError for unknown bots."""
+        return self._signing[bot]
+
+    def verifier(self, kid, now=None):
+        """Return the Signer for kid, or None if the key is unknown or retired."""
+        entry = self._table[kid]
+        if entry is None:
+            return None
+        signer, until = entry
+        if until is not None and (time.time() if now is None else now) >= until:
+            return None
+        return signer
+
+
+default_keyring = Keyring.from_env()
+
+
+def _varint(n):
+    if n < 0x80:
+        return bytes((n,))
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _read_varint(buf, pos):
+    """Read a varint from buf at pos. Returns (value, new_pos)."""
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError('varint too long')
+
+
+def _uid_field(user_id):
+    uid = str(user_id)
+    if uid.isdigit() and uid.isascii() and (uid == '0' or uid[0] != '0'):
+        return _varint(int(uid) << 1)
+    uid_bytes = uid.encode()
+    return _varint(len(uid_bytes) << 1 | 1) + uid_bytes
+
+
+class LinkDictionary:
+    """Shortener prefixes and deflate preset that compact links in one token version.
+
+    Tokens index into both, so a dictionary is frozen once its version ships;
+    changes go into a new dictionary under a new ``TOKEN_VERSION``.
+    """
+
+    # Links shorter than this after the prefix are never worth deflating
+    DEFLATE_MIN_SIZE = 24
+    MAX_LINK_SIZE = 8192
+    _WBITS = -9
+
+    def __init__(self, generic, hosts, zdict):
+        self.prefixes = ('',) + tuple(generic) + tuple(hosts)
+        # generic prefixes are tried longest first when the scheme://host/ head isn't in the table
+        self._generic = sorted(((p, self.prefixes.index(p)) for p in generic), key=lambda g: -len(g[0]))
+        self._hosts = {p: self.prefixes.index(p) for p in hosts}
+        self._zdict = zdict
+        self._deflater = zlib.compressobj(9, zlib.DEFLATED, self._WBITS, 2, zlib.Z_DEFAULT_STRATEGY, zdict)
+        self._inflater = zlib.decompressobj(self._WBITS, zdict)
+
+    def pack(self, link):
+        """Link field bytes for link: the varint tag, then the compacted rest."""
+        slash = link.find('/', 8)
+        index = self._hosts.get(link[:slash + 1]) if slash > 0 else None
+        if index is None:
+            index = 0
+            for prefix, i in self._generic:
+                if link.startswith(prefix):
+                    index = i
+                    break
+        rest = link[len(self.prefixes[index]):].encode()
+        tag = index << 1
+        if self.DEFLATE_MIN_SIZE <= len(rest) <= self.MAX_LINK_SIZE:
+            deflater = self._deflater.copy()
+            packed = deflater.compress(rest) + deflater.flush()
+            if len(packed) < len(rest):
+                rest = packed
+                tag |= 1
+        return _varint(tag) + rest
+
+    def unpack(self, body, pos):
+        """Link stored in body from pos to the end. Raises ValueError or IndexError if malformed."""
+        tag, pos = _read_varint(body, pos)
+        prefix = self.prefixes[tag >> 1]
+        rest = body[pos:]
+        if tag & 1:
+            inflater = self._inflater.copy()
+            try:
+                rest = inflater.decompress(rest, self.MAX_LINK_SIZE)
+            except zlib.error:
+                raise ValueError('bad deflated link')
+            if not inflater.eof or inflater.unconsumed_tail or inflater.unused_data:
+                raise ValueError('bad deflated link')
+        return prefix + rest.decode()
+
+
+# Version 4 dictionary. Frozen: append nothing, reorder nothing (see LinkDictionary).
+LINK_DICTIONARY_V4 = LinkDictionary(
+    generic=('https://', 'http://', 'https://www.', 'http://www.'),
+    hosts=(
+        'https://linkshortify.com/', 'https://short.link/', 'https://shortener.link/',
+        'https://bit.ly/', 'https://tinyurl.com/', 'https://cutt.ly/', 'https://is.gd/', 'https://rb.gy/',
+        'https://t.ly/', 'https://shorturl.at/', 'https://ow.ly/', 'https://t.me/', 'https://telegram.me/',
+        'https://gplinks.co/', 'https://gplinks.in/', 'https://droplink.co/', 'https://shrinkme.io/',
+        'https://shrinkearn.com/', 'https://ouo.io/', 'https://ouo.press/', 'https://exe.io/',
+        'https://shorte.st/', 'https://adf.ly/', 'https://clk.sh/', 'https://shareus.io/', 'https://tnlink.in/',
+        'https://vplink.in/', 'https://omegalinks.in/', 'https://modijiurl.com/', 'https://urlshortx.com/',
+        'https://atglinks.com/', 'https://publicearn.com/', 'https://linkpays.in/', 'https://adrinolinks.in/',
+        'https://krownlinks.me/', 'https://mdiskshortner.link/', 'https://tinyurl.one/', 'https://v.gd/',
+        'https://www.linkshortify.com/', 'https://www.shortener.link/', 'https://www.gplinks.co/',
+        'https://www.droplink.co/', 'https://www.shrinkme.io/', 'https://www.cutt.ly/',
+        'http://bit.ly/', 'http://tinyurl.com/', 'http://linkshortify.com/', 'http://short.link/',
+    ),
+    # Substrings of long shortener links: API and quick-link query strings around a wrapped
+    # destination, usually a bot start link. Commonest last, where matches cost the fewest bits.
+    zdict=(b'.html.php?id=/view?usp=sharing/file/d/drive.google.com/mega.nz/file/terabox.com/s/'
+           b'www.youtube.com/watch?v=youtu.be/&utm_source=telegram&utm_medium=bot&utm_campaign='
+           b'&format=text&alias=&type=1&api=https%3A%2F%2Ft.me%2Fbot?start=verify_'
+           b'https://t.me/&url=https://t.me/st?api='),
+)
+
+LINK_DICTIONARIES = {4: LINK_DICTIONARY_V4}
+
+
+def _header(kid):
+    return bytes((TOKEN_VERSION, kid))
+
+
+def _link_field(shortener_link):
+    return LINK_DICTIONARY_V4.pack(shortener_link)
+
+
+def encode(user_id, shortener_link, timestamp, keyring=None, bot=None):
+    """Build a signed token for user_id/shortener_link issued at timestamp.
+
+    The token is signed with bot's key when bot is given, else the active key.
+    """
+    kid, signer = (keyring or default_keyring).signer_for(bot)
+    body = b''.join((_header(kid), _uid_field(user_id), _pack_ts(timestamp), _link_field(shortener_link)))
+    return _b64encode(body + signer.mac(body)).decode().rstrip('=')
+
+
+def sign_many(items, timestamp, keyring=None, bot=None):
+    """Encode an iterable of (user_id, shortener_link) pairs sharing one timestamp.
+
+    Returns a list of tokens in input order. The header and packed timestamp
+    are built once and the keyed hash states are bound outside the loop.
+    """
+    kid, signer = (keyring or default_keyring).signer_for(bot)
+    head = _header(kid)
+    ts_bytes = _pack_ts(timestamp)
+    inner_copy = signer._inner.copy
+    outer_copy = signer._outer.copy
+    join = b''.join
+    tokens = []
+    append = tokens.append
+    for user_id, shortener_link in items:
+        body = join((head, _uid_field(user_id), ts_bytes, _link_field(shortener_link)))
+        inner = inner_copy()
+        inner.update(body)
+        outer = outer_copy()
+        outer.update(inner.digest())
+        append(_b64encode(body + outer.digest()[:MAC_SIZE]).decode().rstrip('='))
+    return tokens
+
+
+def _decode_binary(token_str, keyring):
+    try:
+        raw = _a2b_base64((token_str + _PADDING[len(token_str) % 4]).encode().translate(_FROM_URLSAFE))
+    except (binascii.Error, ValueError):
+        return _NONE
+    # One spelling per token. The decoder skips characters outside the alphabet and ignores stray
+    # bits in the last one, so only the canonical encoding of the bytes is accepted.
+    if len(raw) <= MAC_SIZE + 2 or _b64encode(raw).decode().rstrip('=') != token_str:
+        return _NONE
+    version = raw[0]
+    if version == TOKEN_VERSION or version == 3:
+        signer = keyring.verifier(raw[1])
+        pos = 2
+    elif version == 2:
+        signer = keyring.verifier(0)
+        pos = 1
+    else:
+        return _NONE
+    if signer is None:
+        return _NONE
+
+    body = raw[:-MAC_SIZE]
+    if not _compare(raw[-MAC_SIZE:], signer.mac(body)):
+        return _NONE
+
+    try:
+        tagged_uid, pos = _read_varint(body, pos)
+        if tagged_uid & 1:
+            end = pos + (tagged_uid >> 1)
+            user_id = body[pos:end].decode()
+            pos = end
+        else:
+            user_id = str(tagged_uid >> 1)
+        timestamp, = _unpack_ts(body, pos)
+        links = LINK_DICTIONARIES.get(version)
+        if links is not None:
+            shortener_link = links.unpack(body, pos + 4)
+        else:
+            link_len, pos = _read_varint(body, pos + 4)
+            if pos + link_len != len(body):
+                return _NONE
+            shortener_link = body[pos:].decode()
+    except (IndexError, ValueError, struct.error):
+        return _NONE
+    return user_id, shortener_link, timestamp
+
+
+def _decode_legacy(token_str, keyring):
+    signer = keyring.verifier(0)
+    if signer is None:
+        return _NONE
+    payload_b64, sig = token_str.rsplit('~', 1)
+    expected_sig = signer.digest(payload_b64.encode()).hex()
+    if not _compare(sig.encode(), expected_sig.encode()):
+        return _NONE
+
+    try:
+        payload = _b64decode(payload_b64 + _PADDING[len(payload_b64) % 4])
+        data = json.loads(payload)
+        return data['uid'], data['link'], data['ts']
+    except (ValueError, KeyError, TypeError):
+        return _NONE
+
+
+def decode(token_str, keyring=None):
+    """Verify and decode a token. Returns (user_id, shortener_link, timestamp) or Nones."""
+    keyring = keyring or default_keyring
+    if '~' in token_str:
+        return _decode_legacy(token_str, keyring)
+    return _decode_binary(token_str, keyring)
+
+
+def signature(token_str):
+    """The MAC of a token :func:`decode` accepted, which identifies it for one-time use."""
+    if '~' in token_str:
+        return bytes.fromhex(token_str.rsplit('~', 1)[1])
+    return _b64decode(token_str + _PADDING[len(token_str) % 4])[-MAC_SIZE:]
+
+
+def verify_many(tokens, keyring=None):
+    """Decode a list of tokens. Returns a list of (user_id, shortener_link, timestamp) or Nones."""
+    keyring = keyring or default_keyring
+    decode_binary = _decode_binary
+    return [
+        _decode_legacy(token, keyring) if '~' in token else decode_binary(token, keyring)
+        for token in tokens
+    ]
@@ -0,0 +1,431 @@
+"""
+Async Vercel Verification Helper
+--------------------------------
+asyncio counterpart of vercel_helper.py for bots built on async frameworks
+(aiogram, python-telegram-bot, Pyrogram...). Uses only the standard library:
+a small HTTP/1.1 client that keeps connections alive and caps how many
+requests are in flight, so the event loop is never blocked.
+
+Usage:
+    from plugins.async_vercel_helper import create_verification_link
+
+    verification_link = await create_verification_link(
+        user_id=123456789,
+        shortener_link="https://linkshortify.com/abc123"
+    )
+
+    # Many at once, at most `max_connections` in flight
+    links = await get_client().create_links([(uid, link) for uid, link in pending])
+
+Like vercel_helper.py, tokens are minted locally without any request when
+VERIFICATION_SECRET_KEY (and VERIFICATION_KEY_ID) are set and the
+bot_verification package is importable.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import ssl
+import time
+from urllib.parse import urlsplit
+
+try:
+    from bot_verification import tokens
+except ImportError:  # optional: only needed for local minting
+    tokens = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt: rate limiting and gateway/cold-start failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HTTPError(Exception):
+    """Malformed or truncated HTTP response"""
+
+
+class AsyncVerificationClient:
+    """
+    Async client for the verification API
+
+    Same behaviour as vercel_helper.VerificationClient: transient failures
+    (connection errors, timeouts, 429/5xx) are retried with jittered
+    exponential backoff, a circuit breaker makes calls fail fast while the API
+    is down, and failures are logged and returned as None.
+
+    Connections are reused across requests; at most `max_connections` are
+    open and in use at a time, extra requests wait for a free one. A client
+    belongs to the event loop it is first used on.
+
+    Example:
+        >>> async with AsyncVerificationClient("https://your-project.vercel.app") as client:
+        ...     link = await client.create_link(123456789, "https://short.link/abc")
+    """
+
+    def __init__(self, base_url=None, max_connections=10, timeout=10.0, connect_timeout=3.05,
+                 max_retries=3, backoff_base=0.25, backoff_max=4.0, failure_threshold=5, reset_timeout=30.0,
+                 secret_key=None, key_id=0):
+        """
+        Args:
+            base_url (str): Deployment URL, defaults to the BOT_URL environment variable
+            max_connections (int): Requests in flight (and keep-alive connections) at most
+            timeout (float): Seconds for one attempt, connecting included
+            connect_timeout (float): Seconds to establish a connection
+            max_retries (int): Extra attempts after the first one
+            backoff_base (float): Backoff cap for the first retry, doubled on each retry
+            backoff_max (float): Upper bound for a single backoff sleep
+            failure_threshold (int): Consecutive failed calls that open the circuit
+            reset_timeout (float): Seconds the circuit stays open before a trial call
+            secret_key (str): Server signing secret; enables local minting
+            key_id (int): Key id of secret_key in the server's keyring
+        """
+        self.base_url = (base_url if base_url is not None else os.getenv('BOT_URL', '')).rstrip('/')
+        parts = urlsplit(self.base_url)
+        self.host = parts.hostname or ''
+        self.tls = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.tls else 80)
+        self.path_prefix = parts.path
+        self.host_header = parts.netloc
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._idle = []
+        self._semaphore = None
+        self._ssl = ssl.create_default_context() if self.tls else None
+
+        self.keyring = None
+        if secret_key:
+            if tokens is None:
+                logger.warning("⚠️ bot_verification is not importable, creating tokens via the API")
+            else:
+                self.keyring = tokens.Keyring({key_id: secret_key}, active=key_id)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    # Circuit breaker (the event loop is single-threaded, so no locking)
+
+    def _allow(self):
+        """True if a call may go out now; 'trial' (also true) if it is the half-open trial call"""
+        if self.opened_at is None:
+            return True
+        if not self._trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._trial = True
+            return 'trial'
+        return False
+
+    def _record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def _record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring a Retry-After within backoff_max"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    # HTTP/1.1 transport
+
+    async def _connect(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self._ssl), self.connect_timeout)
+
+    async def _read_response(self, reader):
+        try:
+            return await self._parse_response(reader)
+        except ValueError as e:
+            # A bad chunk size or Content-Length, or a line longer than the StreamReader limit
+            raise HTTPError(f'Malformed response: {e}')
+
+    async def _parse_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise HTTPError('Connection closed before response')
+        try:
+            status = int(status_line.split(b' ', 2)[1])
+        except (IndexError, ValueError):
+            raise HTTPError(f'Bad status line: {status_line!r}')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    async def _request(self, method, path, body):
+        """One HTTP exchange on a pooled connection. Returns (status, headers, body). Call with _semaphore held."""
+        request = (
+            f'{method} {self.path_prefix}{path} HTTP/1.1\r\n'
+            f'Host: {self.host_header}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            '\r\n'
+        ).encode('latin-1') + body
+
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, data = await self._read_response(reader)
+            except (ConnectionError, HTTPError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The server closed the idle connection: try again on another one
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return status, headers, data
+
+    async def _post(self, path, payload):
+        """
+        POST JSON with retries. Returns the decoded JSON body, or None after logging why not.
+        """
+        allowed = self._allow()
+        if not allowed:
+            logger.error("❌ Verification API circuit open, skipping request")
+            return None
+        try:
+            return await self._send(path, json.dumps(payload).encode())
+        finally:
+            if allowed == 'trial':
+                # A trial call that ended without an outcome (e.g. cancelled) mustn't wedge the breaker
+                self._trial = False
+
+    async def _send(self, path, body):
+        """The retry loop of _post, reporting outcomes to the breaker"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            try:
+                # Waiting for a free connection doesn't count against the timeout
+                async with self._semaphore:
+                    status, headers, data = await asyncio.wait_for(self._request('POST', path, body), self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ Vercel API request timed out (attempt {attempt + 1})")
+                if last_try:
+                    logger.error("❌ Vercel API request timed out")
+                    logger.error("Check if Vercel is running: curl " + self.base_url)
+                    break
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except (OSError, HTTPError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"⚠️ Could not connect to Vercel (attempt {attempt + 1}): {e}")
+                if last_try:
+                    logger.error("❌ Could not connect to Vercel")
+                    logger.error("Check BOT_URL is correct: " + self.base_url)
+                    break
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if status in RETRY_STATUSES and not last_try:
+                logger.warning(f"⚠️ Vercel API returned status {status} (attempt {attempt + 1})")
+                await asyncio.sleep(self._backoff(attempt, headers.get('retry-after')))
+                continue
+
+            if status >= 500 or status == 429:
+                self._record_failure()
+            else:
+                self._record_success()
+
+            if status != 200:
+                logger.error(f"❌ Vercel API returned status {status}")
+                logger.error(f"Response: {data.decode('utf-8', 'replace')}")
+                return None
+            try:
+                return json.loads(data)
+            except ValueError as e:
+                logger.error(f"❌ Invalid JSON response: {e}")
+                return None
+
+        self._record_failure()
+        return None
+
+    async def create_token(self, user_id, shortener_link):
+        """
+        Create a verification token, locally when a secret was given, else via the API
+
+        Returns:
+            str: Token or None if failed
+        """
+        if self.keyring is not None:
+            try:
+                return tokens.encode(user_id, shortener_link, int(time.time()), keyring=self.keyring)
+            except Exception as e:
+                logger.warning(f"⚠️ Local token minting failed, using the API: {e}")
+        data = await self._post('/api/create-token', {'user_id': str(user_id), 'shortener_link': shortener_link})
+        if data is None:
+            return None
+        if not data.get('success'):
+            logger.error(f"❌ Token creation failed: {data.get('message', 'Unknown error')}")
+            return None
+        return data['token']
+
+    async def create_link(self, user_id, shortener_link):
+        """
+        Create a verification link
+
+        Returns:
+            str: Verification link or None if failed
+        """
+        logger.info(f"Creating verification link for user {user_id}")
+        token = await self.create_token(user_id, shortener_link)
+        if token is None:
+            return None
+        logger.info(f"✅ Verification link created successfully")
+        return f"{self.base_url}/pre-verify/{token}?uid={user_id}"
+
+    async def create_links(self, items):
+        """
+        Create verification links for many (user_id, shortener_link) pairs concurrently
+
+        At most `max_connections` requests are in flight at once.
+
+        Returns:
+            list: Verification link or None per item, in input order
+        """
+        return await asyncio.gather(*(self.create_link(user_id, link) for user_id, link in items))
+
+
+_default_client = None
+_default_loop = None
+
+
+def get_client():
+    """
+    Shared AsyncVerificationClient for BOT_URL and the running event loop
+
+    Returns:
+        AsyncVerificationClient: Client or None if BOT_URL is not set
+    """
+    global _default_client, _default_loop
+    vercel_url = os.getenv('BOT_URL', '').rstrip('/')
+    if not vercel_url:
+        logger.error("❌ BOT_URL environment variable not set!")
+        logger.error("Set it with: export BOT_URL=https://your-project.vercel.app")
+        return None
+    loop = asyncio.get_running_loop()
+    if _default_client is None or _default_client.base_url != vercel_url or _default_loop is not loop:
+        _default_client = AsyncVerificationClient(
+            vercel_url,
+            secret_key=os.getenv('VERIFICATION_SECRET_KEY'),
+            key_id=int(os.getenv('VERIFICATION_KEY_ID', '0')),
+        )
+        _default_loop = loop
+    return _default_client
+
+
+async def create_verification_link(user_id, shortener_link):
+    """
+    Create verification link via Vercel API without blocking the event loop
+
+    Args:
+        user_id (int/str): Telegram user ID
+        shortener_link (str): Already shortened URL
+
+    Returns:
+        str: Verification link or None if failed
+    """
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        return await client.create_link(user_id, shortener_link)
+    except Exception as e:
+        logger.error(f"❌ Unexpected error: {e}")
+        return None
+
+
+# Test if run directly
+if __name__ == "__main__":
+    async def main():
+        print("🧪 Testing Async Vercel Helper...")
+        print()
+
+        if not os.getenv('BOT_URL', ''):
+            print("❌ BOT_URL is not set")
+            print("Set it with: export BOT_URL=https://your-project.vercel.app")
+            return 1
+
+        print("Test 1: Create Verification Link")
+        link = await create_verification_link("123456789", "https://example.com/test")
+        if not link:
+            print("❌ Failed to create verification link")
+            return 1
+        print(f"✅ Verification link created:")
+        print(f"   {link}")
+        print()
+
+        print("Test 2: Create 20 Links Concurrently")
+        started = time.perf_counter()
+        links = await get_client().create_links([(str(n), "https://example.com/test") for n in range(20)])
+        if not all(links):
+            print("❌ Some links failed")
+            return 1
+        print(f"✅ {len(links)} links in {time.perf_counter() - started:.2f}s")
+        await get_client().close()
+
+        print()
+        print("🎉 All tests passed!")
+        return 0
+
+    exit(asyncio.run(main()))
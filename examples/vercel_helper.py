@@ -10,21 +10,397 @@ Usage:
         user_id=123456789,
         shortener_link="https://linkshortify.com/abc123"
     )
+
+Local minting:
+    Tokens are self-contained and HMAC-signed, so a bot that knows the
+    server's signing secret can mint them itself with the server's own codec
+    (the bot_verification package from this repository must be importable)
+    instead of calling the API for every link:
+
+        export VERIFICATION_SECRET_KEY=...   # the server's SECRET_KEY
+        export VERIFICATION_KEY_ID=0         # or its key id in SECRET_KEYS
+
+    Without the secret or the package, links are created via the API as usual.
+    Local tokens are stamped with this machine's clock, so keep it in sync.
 """
 
-import requests
-import os
 import logging
+import os
+from collections import OrderedDict
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from bot_verification import tokens
+except ImportError:  # optional: only needed for local minting
+    tokens = None
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Statuses worth another attempt: rate limiting and gateway/cold-start failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Lifetime of a token on the server (TOKEN_TTL in bot_verification/tokens.py)
+TOKEN_TTL = 300
+
+
+class LinkCache:
+    """
+    Recently created verification links, keyed by (user_id, shortener_link)
+
+    A link is handed out again only while more than `min_remaining` seconds of
+    its lifetime are left, so a user tapping "get link" twice gets the same
+    URL instead of a fresh token. At most `maxsize` links are kept, the least
+    recently used going first; expired ones are dropped when looked up.
+
+    Tokens are one-time use: a link the user already completed is rejected
+    by the server, so call invalidate() once you know it was used.
+    """
+
+    def __init__(self, maxsize=1024, min_remaining=120):
+        self.maxsize = maxsize
+        self.min_remaining = min_remaining
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._links = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, user_id, shortener_link):
+        """Cached link with enough lifetime left, or None"""
+        key = (str(user_id), shortener_link)
+        with self._lock:
+            entry = self._links.get(key)
+            if entry is not None:
+                link, expires_at = entry
+                if expires_at - time.monotonic() > self.min_remaining:
+                    self._links.move_to_end(key)
+                    self.hits += 1
+                    return link
+                del self._links[key]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, shortener_link, link, expires_at):
+        """Remember link until expires_at (a time.monotonic() value)"""
+        key = (str(user_id), shortener_link)
+        with self._lock:
+            self._links[key] = (link, expires_at)
+            self._links.move_to_end(key)
+            while len(self._links) > self.maxsize:
+                self._links.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id, shortener_link):
+        with self._lock:
+            self._links.pop((str(user_id), shortener_link), None)
+
+    def stats(self):
+        return {'size': len(self._links), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the API is down
+
+    After `failure_threshold` consecutive failed calls the circuit opens and
+    calls are refused for `reset_timeout` seconds. Then a single trial call is
+    let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self._trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """
+        True if a call may go out now; "trial" (also true) if it is the half-open trial call,
+        which the caller must end with record_success, record_failure or release
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial = True
+                return "trial"
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """End the trial call without counting it, so the next call may try again. Only the trial caller calls this"""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+class VerificationClient:
+    """
+    Reusable client for the verification API
+
+    Keeps TLS connections to Vercel alive in a pooled `requests.Session`,
+    retries transient failures (connection errors, timeouts, 429/5xx) with
+    jittered exponential backoff and stops calling the API while a circuit
+    breaker is open. Minting a token has no server-side state, so repeating a
+    create-token POST whose response was lost is safe.
+
+    Safe to share between threads; create one per process and reuse it.
+
+    Example:
+        >>> client = VerificationClient("https://your-project.vercel.app")
+        >>> client.create_link(123456789, "https://short.link/abc")
+        'https://your-project.vercel.app/pre-verify/token123?uid=123456789'
+    """
+
+    def __init__(self, base_url=None, pool_connections=1, pool_maxsize=10, timeout=(3.05, 10),
+                 max_retries=3, backoff_base=0.25, backoff_max=4.0, breaker=None, secret_key=None, key_id=0,
+                 cache=None):
+        """
+        Args:
+            base_url (str): Deployment URL, defaults to the BOT_URL environment variable
+            pool_connections (int): Number of hosts to keep connection pools for
+            pool_maxsize (int): Keep-alive connections per host (match your worker/thread count)
+            timeout (float or tuple): requests timeout, (connect, read) seconds
+            max_retries (int): Extra attempts after the first one
+            backoff_base (float): Backoff cap for the first retry, doubled on each retry
+            backoff_max (float): Upper bound for a single backoff sleep
+            breaker (CircuitBreaker): Shared breaker, a new default one if None
+            secret_key (str): Server signing secret; enables local minting
+            key_id (int): Key id of secret_key in the server's keyring
+            cache (LinkCache): Reuse recent links per (user_id, shortener_link); None disables
+        """
+        self.base_url = (base_url if base_url is not None else os.getenv('BOT_URL', '')).rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.cache = cache
+
+        self.keyring = None
+        if secret_key:
+            if tokens is None:
+                logger.warning("⚠️ bot_verification is not importable, creating tokens via the API")
+            else:
+                self.keyring = tokens.Keyring({key_id: secret_key}, active=key_id)
+
+        self.session = requests.Session()
+        # Retries are done here, with jitter and the breaker, not by urllib3
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring a Retry-After within backoff_max"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def _post(self, path, payload):
+        """
+        POST JSON with retries. Returns the decoded JSON body, or None after logging why not.
+        """
+        allowed = self.breaker.allow()
+        if not allowed:
+            logger.error("❌ Verification API circuit open, skipping request")
+            return None
+        try:
+            return self._send(f"{self.base_url}{path}", payload)
+        finally:
+            if allowed == "trial":
+                # A trial call that ended without an outcome (e.g. a broken response) mustn't wedge the breaker
+                self.breaker.release()
+
+    def _send(self, url, payload):
+        """The retry loop of _post, reporting outcomes to the breaker"""
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.exceptions.Timeout:
+                logger.warning(f"⚠️ Vercel API request timed out (attempt {attempt + 1})")
+                if last_try:
+                    logger.error("❌ Vercel API request timed out")
+                    logger.error("Check if Vercel is running: curl " + self.base_url)
+                    break
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.exceptions.ConnectionError:
+                logger.warning(f"⚠️ Could not connect to Vercel (attempt {attempt + 1})")
+                if last_try:
+                    logger.error("❌ Could not connect to Vercel")
+                    logger.error("Check BOT_URL is correct: " + self.base_url)
+                    break
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.exceptions.RequestException as e:
+                # Invalid URL and the like: retrying won't help and the API isn't to blame
+                logger.error(f"❌ Network error: {e}")
+                return None
+
+            if response.status_code in RETRY_STATUSES and not last_try:
+                logger.warning(f"⚠️ Vercel API returned status {response.status_code} (attempt {attempt + 1})")
+                time.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+                continue
+
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+            if response.status_code != 200:
+                logger.error(f"❌ Vercel API returned status {response.status_code}")
+                logger.error(f"Response: {response.text}")
+                return None
+            try:
+                return response.json()
+            except ValueError as e:
+                logger.error(f"❌ Invalid JSON response: {e}")
+                return None
+
+        self.breaker.record_failure()
+        return None
+
+    def create_token(self, user_id, shortener_link):
+        """
+        Create a verification token, locally when a secret was given, else via the API
+
+        Returns:
+            str: Token or None if failed
+        """
+        if self.keyring is not None:
+            try:
+                return tokens.encode(user_id, shortener_link, int(time.time()), keyring=self.keyring)
+            except Exception as e:
+                logger.warning(f"⚠️ Local token minting failed, using the API: {e}")
+        data = self._post('/api/create-token', {'user_id': str(user_id), 'shortener_link': shortener_link})
+        if data is None:
+            return None
+        if not data.get('success'):
+            logger.error(f"❌ Token creation failed: {data.get('message', 'Unknown error')}")
+            return None
+        return data['token']
+
+    def create_link(self, user_id, shortener_link):
+        """
+        Create a verification link, or return a cached one that is still fresh
+
+        Returns:
+            str: Verification link or None if failed
+        """
+        if self.cache is not None:
+            link = self.cache.get(user_id, shortener_link)
+            if link is not None:
+                return link
+
+        logger.info(f"Creating verification link for user {user_id}")
+        # The token's timestamp is at or after this, minus the server's rounding down to whole seconds
+        issued = time.monotonic() - 1
+        token = self.create_token(user_id, shortener_link)
+        if token is None:
+            return None
+        logger.info(f"✅ Verification link created successfully")
+        link = f"{self.base_url}/pre-verify/{token}?uid={user_id}"
+        if self.cache is not None:
+            self.cache.put(user_id, shortener_link, link, issued + TOKEN_TTL)
+        return link
+
+
+def _cache_from_env():
+    """LinkCache sized by VERIFICATION_LINK_CACHE_SIZE and VERIFICATION_LINK_MIN_REMAINING, or None
+
+    Off unless VERIFICATION_LINK_CACHE_SIZE is set: tokens are one-time use, so a
+    cached link the user already completed comes back as "already been used"
+    unless the bot calls invalidate() when it learns of the completion.
+    """
+    size = int(os.getenv('VERIFICATION_LINK_CACHE_SIZE', '0'))
+    if size <= 0:
+        return None
+    return LinkCache(size, float(os.getenv('VERIFICATION_LINK_MIN_REMAINING', '120')))
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Shared VerificationClient for the BOT_URL environment variable
+
+    Returns:
+        VerificationClient: Client or None if BOT_URL is not set
+    """
+    global _default_client
+    vercel_url = os.getenv('BOT_URL', '').rstrip('/')
+    if not vercel_url:
+        logger.error("❌ BOT_URL environment variable not set!")
+        logger.error("Set it with: export BOT_URL=https://your-project.vercel.app")
+        return None
+    with _default_client_lock:
+        if _default_client is None or _default_client.base_url != vercel_url:
+            if _default_client is not None:
+                _default_client.close()
+            _default_client = VerificationClient(
+                vercel_url,
+                secret_key=os.getenv('VERIFICATION_SECRET_KEY'),
+                key_id=int(os.getenv('VERIFICATION_KEY_ID', '0')),
+                cache=_cache_from_env(),
+            )
+        return _default_client
+
 
 def create_verification_link(user_id, shortener_link):
     """
     Create verification link via Vercel API
     
+    Uses the shared pooled, retrying client from get_client(), which mints
+    tokens locally when VERIFICATION_SECRET_KEY is set.
+    
     Args:
         user_id (int/str): Telegram user ID
         shortener_link (str): Already shortened URL
@@ -37,70 +413,11 @@ def create_verification_link(user_id, shortener_link):
         >>> print(link)
         https://your-project.vercel.app/pre-verify/token123?uid=123456789
     """
-    
-    # Get Vercel URL from environment
-    vercel_url = os.getenv('BOT_URL', '')
-    
-    if not vercel_url:
-        logger.error("❌ BOT_URL environment variable not set!")
-        logger.error("Set it with: export BOT_URL=https://your-project.vercel.app")
+    client = get_client()
+    if client is None:
         return None
-    
-    # Remove trailing slash
-    vercel_url = vercel_url.rstrip('/')
-    
     try:
-        logger.info(f"Creating verification link for user {user_id}")
-        
-        # Call Vercel API to create token
-        response = requests.post(
-            f"{vercel_url}/api/create-token",
-            json={
-                'user_id': str(user_id),
-                'shortener_link': shortener_link
-            },
-            timeout=10,
-            headers={'Content-Type': 'application/json'}
-        )
-        
-        # Check HTTP status
-        if response.status_code != 200:
-            logger.error(f"❌ Vercel API returned status {response.status_code}")
-            logger.error(f"Response: {response.text}")
-            return None
-        
-        # Parse JSON response
-        data = response.json()
-        
-        # Check if successful
-        if data.get('success'):
-            token = data['token']
-            verification_link = f"{vercel_url}/pre-verify/{token}?uid={user_id}"
-            logger.info(f"✅ Verification link created successfully")
-            return verification_link
-        else:
-            error_msg = data.get('message', 'Unknown error')
-            logger.error(f"❌ Token creation failed: {error_msg}")
-            return None
-    
-    except requests.exceptions.Timeout:
-        logger.error("❌ Vercel API request timed out (>10 seconds)")
-        logger.error("Check if Vercel is running: curl " + vercel_url)
-        return None
-    
-    except requests.exceptions.ConnectionError:
-        logger.error("❌ Could not connect to Vercel")
-        logger.error("Check BOT_URL is correct: " + vercel_url)
-        return None
-    
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Network error: {e}")
-        return None
-    
-    except ValueError as e:
-        logger.error(f"❌ Invalid JSON response: {e}")
-        return None
-    
+        return client.create_link(user_id, shortener_link)
     except Exception as e:
         logger.error(f"❌ Unexpected error: {e}")
         return None
@@ -120,7 +437,7 @@ def test_connection():
         return False
     
     try:
-        response = requests.get(vercel_url, timeout=5)
+        response = get_client().session.get(vercel_url, timeout=5)
         if response.status_code == 200:
             print(f"✅ Vercel is reachable: {vercel_url}")
             return True
@@ -132,11 +449,54 @@ def test_connection():
         return False
 
 
-# Test if run directly
+def check_local_minting():
+    """
+    Check that locally minted tokens verify through api/verify.py's decode_token
+
+    Needs this repository's layout (run from a checkout). Returns True on success.
+    """
+    import importlib.util
+    import sys
+
+    global tokens
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if tokens is None:
+        sys.path.insert(0, root)
+        from bot_verification import tokens
+    spec = importlib.util.spec_from_file_location('api_verify', os.path.join(root, 'api', 'verify.py'))
+    verify = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(verify)
+
+    # Signs with the server's key 0: SECRET_KEY, or its default when unset
+    client = VerificationClient('https://example.invalid', secret_key=os.getenv('SECRET_KEY', tokens.SECRET_KEY))
+    cases = [("123456789", "https://linkshortify.com/abc123"), ("@user_name", "https://example.com/ü?a=1&b=2")]
+    for user_id, link in cases:
+        token = client.create_token(user_id, link)
+        decoded_user, decoded_link, time_left = verify.decode_token(token)
+        if (decoded_user, decoded_link) != (user_id, link) or not 0 < time_left <= tokens.TOKEN_TTL:
+            print(f"❌ Local token for {user_id!r} did not verify: {(decoded_user, decoded_link, time_left)}")
+            return False
+        # Byte-identical to what /api/create-token mints for the same second
+        _, _, issued_at = tokens.decode(token)
+        if token != tokens.encode(user_id, link, issued_at):
+            print(f"❌ Local token for {user_id!r} differs from the server's")
+            return False
+    return True
+
+
 if __name__ == "__main__":
     print("🧪 Testing Vercel Helper...")
     print()
     
+    # Test 0: Local minting (offline)
+    print("Test 0: Local Token Minting")
+    if check_local_minting():
+        print("✅ Locally minted tokens verify on the server")
+    else:
+        exit(1)
+    
+    print()
+    
     # Test 1: Check environment
     print("Test 1: Environment Variable")
     bot_url = os.getenv('BOT_URL', '')